@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+from calendario import compor_se, decompor_se, deslocar_ses
+
+# Modelos de referência sazonais, calculados direto dos casos semanais com
+# operações agrupadas do NumPy (sem treinamento)
+BASELINES = {
+    "Média semanal": 'media',
+    "Mediana semanal": 'mediana',
+    "Sazonal ingênuo": 'ingenuo',
+    "Perfil sazonal exponencial": 'exponencial',
+}
+
+# Peso do ano mais recente no perfil exponencial; cada ano anterior pesa (1 - ALFA) vezes menos
+ALFA_EXPONENCIAL = 0.5
+
+
+# Matriz anos x semanas (1 a 53) com os casos; NaN onde não há dado
+def _matriz(anos, semanas, casos):
+    anos_unicos, linhas = np.unique(anos, return_inverse=True)
+    matriz = np.full((len(anos_unicos), 53), np.nan)
+    matriz[linhas, semanas - 1] = casos
+    return matriz
+
+
+# Perfil sazonal (casos esperados em cada semana 1 a 53) a partir da matriz anos x semanas
+def perfil_sazonal(matriz, metodo):
+    presentes = ~np.isnan(matriz)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if metodo == 'media':
+            perfil = np.nansum(matriz, axis=0) / presentes.sum(axis=0)
+        elif metodo == 'mediana':
+            ordenada = np.sort(matriz, axis=0)  # NaN vão para o fim
+            contagem = presentes.sum(axis=0)
+            colunas = np.arange(matriz.shape[1])
+            baixo = ordenada[np.maximum((contagem - 1) // 2, 0), colunas]
+            alto = ordenada[np.maximum(contagem // 2, 0), colunas]
+            perfil = np.where(contagem > 0, (baixo + alto) / 2, np.nan)
+        elif metodo == 'ingenuo':
+            # Último ano com dado em cada semana
+            ultimo = np.where(presentes, np.arange(matriz.shape[0])[:, None], -1).max(axis=0)
+            perfil = np.where(ultimo >= 0, matriz[np.maximum(ultimo, 0), np.arange(matriz.shape[1])], np.nan)
+        elif metodo == 'exponencial':
+            idade = matriz.shape[0] - 1 - np.arange(matriz.shape[0])
+            pesos = ((1 - ALFA_EXPONENCIAL) ** idade)[:, None] * presentes
+            perfil = np.nansum(matriz * pesos, axis=0) / pesos.sum(axis=0)
+        else:
+            raise ValueError(f"Modelo de referência desconhecido: {metodo}")
+
+    # A semana 53 só existe em alguns anos: sem dado, repete a semana 52
+    if np.isnan(perfil[52]):
+        perfil[52] = perfil[51]
+    return np.nan_to_num(perfil)
+
+
+# Função para prever as próximas semanas com um modelo de referência. As métricas
+# comparam o perfil calculado sem o último ano selecionado com os casos desse ano.
+def prever_baseline(serie, anos, model_option, horizonte=52):
+    metodo = BASELINES[model_option]
+    selecionada = serie[serie['Ano'].isin(anos)]
+    anos_serie = selecionada['Ano'].to_numpy(dtype=np.int64)
+    semanas = selecionada['Semana'].to_numpy(dtype=np.int64)
+    casos = selecionada['Casos'].to_numpy(dtype=np.float64)
+    if len(casos) == 0:
+        raise ValueError("Nenhum ano selecionado para calcular o modelo de referência.")
+
+    matriz = _matriz(anos_serie, semanas, casos)
+    perfil = perfil_sazonal(matriz, metodo)
+
+    # Avaliação: último ano selecionado contra o perfil dos anos anteriores
+    reais = matriz[-1][~np.isnan(matriz[-1])]
+    if matriz.shape[0] > 1 and len(reais):
+        previstos = perfil_sazonal(matriz[:-1], metodo)[~np.isnan(matriz[-1])]
+        erros = reais - previstos
+        variancia = ((reais - reais.mean()) ** 2).sum()
+        r2 = 1 - (erros ** 2).sum() / variancia if variancia > 0 else 0.0
+        mae, mse = np.abs(erros).mean(), (erros ** 2).mean()
+    else:
+        r2 = mae = mse = 0.0
+
+    # Semanas futuras a partir da última semana observada da série
+    ultima = compor_se(serie['Ano'].iloc[-1], serie['Semana'].iloc[-1])
+    anos_futuros, semanas_futuras = decompor_se(deslocar_ses(ultima, np.arange(1, horizonte + 1)))
+
+    return {
+        'modelo': None,
+        'origens': 1,
+        'horizonte_validacao': len(reais),
+        'r2': r2,
+        'model_accuracy': max(0, min(r2 * 100, 100)),
+        'mse': mse,
+        'mae': mae,
+        'previsao': pd.DataFrame({
+            'Ano': anos_futuros,
+            'Semana': semanas_futuras,
+            'Casos previstos': perfil[semanas_futuras - 1],
+        }),
+    }
@@ -0,0 +1,233 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+import municipios
+from baselines import BASELINES
+from ingestao import alertcity_para_dataframe
+from motor_previsao import prever_recursivo
+from previsao import MODEL_OPTIONS, forecast_figure, forecast_model, train_model
+from simulador_api import DIRETORIO_FIXTURES
+from sincronizacao import ler_serie
+
+# Benchmark de desempenho e precisão da previsão, sem acesso à rede: usa séries
+# do alertcity gravadas em disco. Uso:
+#   python benchmark.py gravar --municipios 3550308 3304557 --doenca dengue
+#   python benchmark.py executar --amostra 20 --saida resultados.json
+
+DIRETORIO_RESULTADOS = 'benchmark_resultados'
+ETAPAS = ['catalogo_frio', 'carregar_municipios', 'ingestao', 'groupby', 'treino', 'previsao', 'grafico']
+# O total é o de uma requisição com o catálogo já carregado no processo, como nas páginas
+ETAPAS_TOTAL = ETAPAS[1:]
+
+
+# Função para gravar como fixtures as séries já armazenadas localmente
+def gravar_fixtures(geocodes, disease, diretorio=DIRETORIO_FIXTURES):
+    os.makedirs(diretorio, exist_ok=True)
+    gravados = 0
+    for geocode in geocodes:
+        registros = ler_serie(geocode, disease)
+        if not registros:
+            print(f"{geocode} {disease}: sem dados locais (rode o prefetch.py antes)", file=sys.stderr)
+            continue
+        with open(os.path.join(diretorio, f'{geocode}_{disease}.json'), 'w') as file:
+            json.dump(registros, file)
+        gravados += 1
+    return gravados
+
+
+def _listar_fixtures(diretorio, disease):
+    fixtures = []
+    for caminho in sorted(glob.glob(os.path.join(diretorio, f'*_{disease}.json'))):
+        geocode = int(os.path.basename(caminho).split('_')[0])
+        fixtures.append((geocode, caminho))
+    return fixtures
+
+
+# Executa todas as etapas para um município e modelo; devolve os tempos e o artefato
+def _executar_etapas(caminho_allmun, caminho_fixture, geocode, disease, model_option):
+    tempos = {}
+
+    # Primeira requisição do processo: catálogo lido do disco (já pré-processado)
+    inicio = time.perf_counter()
+    municipios.CatalogoMunicipios().atributos(geocode)
+    tempos['catalogo_frio'] = time.perf_counter() - inicio
+
+    # Como nas páginas: catálogo já carregado no processo e atributos do município
+    inicio = time.perf_counter()
+    municipios.carregar_catalogo(caminho_allmun).atributos(geocode)
+    tempos['carregar_municipios'] = time.perf_counter() - inicio
+
+    with open(caminho_fixture, 'r') as file:
+        registros = json.load(file)
+
+    inicio = time.perf_counter()
+    historical_df = alertcity_para_dataframe(registros)
+    tempos['ingestao'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    historical_weekly_cases = historical_df.groupby(['Ano', 'Semana']).mean().reset_index()
+    tempos['groupby'] = time.perf_counter() - inicio
+
+    years = sorted(historical_weekly_cases['Ano'].unique().tolist())
+    if model_option in BASELINES:
+        # Modelos de referência não têm treino: o cálculo inteiro conta como previsão
+        tempos['treino'] = 0.0
+        inicio = time.perf_counter()
+        artefato = forecast_model(geocode, disease, historical_weekly_cases, years, model_option)
+        tempos['previsao'] = time.perf_counter() - inicio
+    else:
+        inicio = time.perf_counter()
+        artefato = train_model(historical_weekly_cases, years, model_option)
+        tempos['treino'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        prever_recursivo(artefato['modelo'], historical_weekly_cases, len(artefato['previsao']))
+        tempos['previsao'] = time.perf_counter() - inicio
+
+    # Gráfico montado e serializado, como é enviado ao navegador
+    inicio = time.perf_counter()
+    forecast_figure(historical_weekly_cases, years, artefato).to_json()
+    tempos['grafico'] = time.perf_counter() - inicio
+
+    return tempos, artefato
+
+
+def _percentis(valores):
+    valores = np.asarray(valores) * 1000
+    return {
+        'p50_ms': float(np.percentile(valores, 50)),
+        'p90_ms': float(np.percentile(valores, 90)),
+        'p99_ms': float(np.percentile(valores, 99)),
+        'max_ms': float(valores.max()),
+    }
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Função para executar o benchmark e montar o relatório
+def executar_benchmark(disease, model_options, amostra=None, repeticoes=3, semente=42,
+                       diretorio=DIRETORIO_FIXTURES, caminho_allmun=municipios.ARQUIVO_MUNICIPIOS, memoria=True):
+    fixtures = _listar_fixtures(diretorio, disease)
+    if not fixtures:
+        raise FileNotFoundError(f"Nenhuma fixture de {disease} em {diretorio}. Grave com: python benchmark.py gravar")
+    if amostra and amostra < len(fixtures):
+        fixtures = sorted(random.Random(semente).sample(fixtures, amostra))
+
+    # Pré-processamento do allmun.json (só quando o catálogo está desatualizado)
+    # fora das medições de tempo e de memória
+    municipios.carregar_catalogo(caminho_allmun)
+
+    resultados = {}
+    for model_option in model_options:
+        tempos = {etapa: [] for etapa in ETAPAS}
+        picos = []
+        metricas = []
+        for geocode, caminho in fixtures:
+            for _ in range(repeticoes):
+                tempos_execucao, artefato = _executar_etapas(caminho_allmun, caminho, geocode, disease, model_option)
+                for etapa, segundos in tempos_execucao.items():
+                    tempos[etapa].append(segundos)
+            metricas.append({'geocode': geocode, 'r2': float(artefato['r2']),
+                             'mae': float(artefato['mae'])})
+
+            # Memória medida numa execução separada: o tracemalloc distorce os tempos
+            if memoria:
+                tracemalloc.start()
+                _executar_etapas(caminho_allmun, caminho, geocode, disease, model_option)
+                picos.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+
+        total = np.sum([tempos[etapa] for etapa in ETAPAS_TOTAL], axis=0)
+        resultados[model_option] = {
+            'etapas': {etapa: _percentis(valores) for etapa, valores in tempos.items()},
+            'total': _percentis(total),
+            'pico_memoria_mb': max(picos) / 2 ** 20 if picos else None,
+            'r2_medio': float(np.mean([m['r2'] for m in metricas])),
+            'mae_medio': float(np.mean([m['mae'] for m in metricas])),
+            'municipios': metricas,
+        }
+
+    return {
+        'executado_em': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit_atual(),
+        'python': platform.python_version(),
+        'maquina': platform.machine(),
+        'cpus': os.cpu_count(),
+        'doenca': disease,
+        'municipios': [geocode for geocode, _ in fixtures],
+        'repeticoes': repeticoes,
+        'resultados': resultados,
+    }
+
+
+def _imprimir_resumo(relatorio):
+    print(f"{'modelo':<28} {'total p50':>10} {'total p90':>10} {'treino p50':>11} "
+          f"{'catálogo frio':>14} {'mem MB':>8} {'R²':>7} {'MAE':>8}")
+    for model_option, resultado in relatorio['resultados'].items():
+        memoria = resultado['pico_memoria_mb']
+        print(f"{model_option:<28} {resultado['total']['p50_ms']:>9.1f}ms {resultado['total']['p90_ms']:>9.1f}ms "
+              f"{resultado['etapas']['treino']['p50_ms']:>10.1f}ms "
+              f"{resultado['etapas']['catalogo_frio']['p50_ms']:>13.1f}ms "
+              f"{memoria if memoria is None else round(memoria, 1)!s:>8} "
+              f"{resultado['r2_medio']:>7.3f} {resultado['mae_medio']:>8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de desempenho e precisão da previsão.")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    gravar = subparsers.add_parser('gravar', help="Grava fixtures a partir das séries locais")
+    gravar.add_argument('--municipios', nargs='+', type=int, metavar='GEOCODE')
+    gravar.add_argument('--uf', help="Grava todos os municípios desta UF com dados locais")
+    gravar.add_argument('--doenca', default='dengue')
+    gravar.add_argument('--fixtures', default=DIRETORIO_FIXTURES)
+
+    executar = subparsers.add_parser('executar', help="Executa o benchmark com as fixtures gravadas")
+    executar.add_argument('--doenca', default='dengue')
+    executar.add_argument('--modelos', nargs='+', choices=MODEL_OPTIONS + list(BASELINES),
+                          default=MODEL_OPTIONS + list(BASELINES))
+    executar.add_argument('--amostra', type=int, help="Número de municípios sorteados entre as fixtures")
+    executar.add_argument('--repeticoes', type=int, default=3)
+    executar.add_argument('--semente', type=int, default=42)
+    executar.add_argument('--fixtures', default=DIRETORIO_FIXTURES)
+    executar.add_argument('--sem-memoria', action='store_true', help="Não mede o pico de memória")
+    executar.add_argument('--saida', help="Arquivo JSON do resultado (padrão: benchmark_resultados/<data>.json)")
+    args = parser.parse_args(argv)
+
+    if args.comando == 'gravar':
+        geocodes = args.municipios or municipios.carregar_catalogo().geocodes_da_uf(args.uf)
+        gravados = gravar_fixtures(geocodes, args.doenca, args.fixtures)
+        print(f"{gravados} fixtures gravadas em {args.fixtures}", file=sys.stderr)
+        return 0
+
+    relatorio = executar_benchmark(args.doenca, args.modelos, args.amostra, args.repeticoes, args.semente,
+                                   args.fixtures, memoria=not args.sem_memoria)
+    saida = args.saida or os.path.join(DIRETORIO_RESULTADOS, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(saida) or '.', exist_ok=True)
+    with open(saida, 'w') as file:
+        json.dump(relatorio, file, indent=2, ensure_ascii=False)
+
+    _imprimir_resumo(relatorio)
+    print(f"Resultado salvo em {saida}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
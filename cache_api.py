@@ -0,0 +1,77 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from config import DIRETORIO_CACHE, TTL_ANO_CORRENTE
+
+ARQUIVO_CACHE = os.path.join(DIRETORIO_CACHE, 'infodengue.sqlite')
+
+ESQUEMA_CACHE = """
+    CREATE TABLE IF NOT EXISTS alertcity (
+        geocode INTEGER NOT NULL,
+        disease TEXT NOT NULL,
+        ew_start INTEGER NOT NULL,
+        ew_end INTEGER NOT NULL,
+        ey_start INTEGER NOT NULL,
+        ey_end INTEGER NOT NULL,
+        gravado_em REAL NOT NULL,
+        dados BLOB NOT NULL,
+        PRIMARY KEY (geocode, disease, ew_start, ew_end, ey_start, ey_end)
+    )
+"""
+
+# Uma conexão SQLite por thread e por arquivo (o Streamlit atende cada sessão em uma thread)
+_local = threading.local()
+
+
+# Função para abrir (uma vez por thread) um banco SQLite do diretório de cache
+def conectar(arquivo, esquema):
+    conexoes = getattr(_local, 'conexoes', None)
+    if conexoes is None:
+        conexoes = _local.conexoes = {}
+    conexao = conexoes.get(arquivo)
+    if conexao is None:
+        os.makedirs(os.path.dirname(arquivo) or '.', exist_ok=True)
+        conexao = sqlite3.connect(arquivo, timeout=30)
+        conexao.execute('PRAGMA journal_mode=WAL')
+        conexao.executescript(esquema)
+        conexoes[arquivo] = conexao
+    return conexao
+
+
+def _conexao():
+    return conectar(ARQUIVO_CACHE, ESQUEMA_CACHE)
+
+
+def _chave(geocode, disease, ew_start, ew_end, ey_start, ey_end):
+    return (int(geocode), disease.lower(), ew_start, ew_end, ey_start, ey_end)
+
+
+# Função para ler uma resposta do cache; retorna None se ausente ou expirada
+def obter(geocode, disease, ew_start, ew_end, ey_start, ey_end):
+    chave = _chave(geocode, disease, ew_start, ew_end, ey_start, ey_end)
+    linha = _conexao().execute(
+        'SELECT gravado_em, dados FROM alertcity WHERE geocode=? AND disease=? '
+        'AND ew_start=? AND ew_end=? AND ey_start=? AND ey_end=?', chave).fetchone()
+    if linha is None:
+        return None
+
+    gravado_em, dados = linha
+    # Só o ano corrente ainda recebe atualizações da API
+    if ey_end >= datetime.now().year and time.time() - gravado_em > TTL_ANO_CORRENTE:
+        return None
+    return json.loads(zlib.decompress(dados))
+
+
+# Função para gravar uma resposta da API no cache
+def salvar(geocode, disease, ew_start, ew_end, ey_start, ey_end, dados):
+    chave = _chave(geocode, disease, ew_start, ew_end, ey_start, ey_end)
+    conteudo = zlib.compress(json.dumps(dados).encode('utf-8'))
+    conexao = _conexao()
+    with conexao:
+        conexao.execute('INSERT OR REPLACE INTO alertcity VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        chave + (time.time(), conteudo))
@@ -0,0 +1,94 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+# Calendário epidemiológico: semanas de domingo a sábado; a semana 1 é a
+# primeira semana com pelo menos quatro dias no ano (a que contém 4 de janeiro).
+# As semanas são identificadas pelo código SE = ano * 100 + semana (ex: 202350).
+
+
+# Domingo que inicia a semana 1 do ano epidemiológico
+def inicio_ano(ano):
+    quatro_jan = date(ano, 1, 4)
+    return quatro_jan - timedelta(days=(quatro_jan.weekday() + 1) % 7)
+
+
+# Quantidade de semanas do ano epidemiológico (52 ou 53)
+def semanas_no_ano(ano):
+    return (inicio_ano(ano + 1) - inicio_ano(ano)).days // 7
+
+
+# Domingo que inicia a semana informada
+def inicio_semana(ano, semana):
+    return inicio_ano(ano) + timedelta(weeks=semana - 1)
+
+
+# Ano e semana epidemiológica de uma data
+def semana_epidemiologica(data):
+    ano = data.year
+    if data < inicio_ano(ano):
+        ano -= 1
+    elif data >= inicio_ano(ano + 1):
+        ano += 1
+    return ano, (data - inicio_ano(ano)).days // 7 + 1
+
+
+# Código SE da semana corrente
+def se_atual():
+    ano, semana = semana_epidemiologica(date.today())
+    return ano * 100 + semana
+
+
+# Código SE deslocado de um número de semanas (negativo volta no tempo)
+def deslocar_se(se, semanas):
+    ano, semana = divmod(se, 100)
+    novo_ano, nova_semana = semana_epidemiologica(inicio_semana(ano, semana) + timedelta(weeks=semanas))
+    return novo_ano * 100 + nova_semana
+
+
+# Versões vetorizadas (NumPy) das conversões acima: recebem arrays (ou
+# escalares) de anos, semanas, códigos SE ou datas datetime64[D]
+
+# Domingo que inicia a semana 1 de cada ano (1970-01-01, o dia 0, foi uma quinta-feira)
+def inicio_anos(anos):
+    anos = np.asarray(anos, dtype=np.int64)
+    quatro_jan = (anos - 1970).astype('datetime64[Y]').astype('datetime64[D]') + 3
+    return quatro_jan - (quatro_jan.astype(np.int64) + 4) % 7
+
+
+# Quantidade de semanas (52 ou 53) de cada ano
+def semanas_nos_anos(anos):
+    anos = np.asarray(anos, dtype=np.int64)
+    return (inicio_anos(anos + 1) - inicio_anos(anos)).astype(np.int64) // 7
+
+
+# Ano e semana de cada código SE
+def decompor_se(se):
+    se = np.asarray(se, dtype=np.int64)
+    return se // 100, se % 100
+
+
+# Código SE de cada par ano e semana
+def compor_se(anos, semanas):
+    return np.asarray(anos, dtype=np.int64) * 100 + np.asarray(semanas, dtype=np.int64)
+
+
+# Domingo que inicia a semana de cada código SE
+def inicio_semanas(se):
+    anos, semanas = decompor_se(se)
+    return inicio_anos(anos) + (semanas - 1) * 7
+
+
+# Código SE da semana que contém cada data
+def se_das_datas(datas):
+    datas = np.asarray(datas, dtype='datetime64[D]')
+    anos = datas.astype('datetime64[Y]').astype(np.int64) + 1970
+    anos = np.where(datas < inicio_anos(anos), anos - 1, anos)
+    anos = np.where(datas >= inicio_anos(anos + 1), anos + 1, anos)
+    return compor_se(anos, (datas - inicio_anos(anos)).astype(np.int64) // 7 + 1)
+
+
+# Códigos SE deslocados de um número de semanas (ex: np.arange(1, 53) para as
+# 52 semanas seguintes a uma SE)
+def deslocar_ses(se, semanas):
+    return se_das_datas(inicio_semanas(se) + np.asarray(semanas, dtype=np.int64) * 7)
@@ -0,0 +1,190 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import cache_api
+from config import (URL_API, TIMEOUT_CONEXAO, TIMEOUT_LEITURA, TENTATIVAS_API,
+                    BACKOFF_INICIAL, BACKOFF_MAXIMO, CONEXOES_API,
+                    FALHAS_DISJUNTOR, PAUSA_DISJUNTOR)
+from metricas import etapa
+
+
+# Erro ao obter dados da API Info Dengue (a mensagem é exibida ao usuário)
+class ErroAPI(Exception):
+    pass
+
+
+# A API foi desligada temporariamente pelo disjuntor após falhas seguidas
+class APIIndisponivel(ErroAPI):
+    pass
+
+
+# Sessão compartilhada: mantém as conexões abertas (keep-alive) entre chamadas
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=CONEXOES_API))
+_session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=CONEXOES_API))
+
+
+# Disjuntor: depois de falhas seguidas, recusa chamadas até o fim da pausa
+class _Disjuntor:
+    def __init__(self, falhas_maximas, pausa):
+        self.falhas_maximas = falhas_maximas
+        self.pausa = pausa
+        self._falhas = 0
+        self._aberto_ate = 0.0
+        self._lock = threading.Lock()
+
+    def verificar(self):
+        with self._lock:
+            restante = self._aberto_ate - time.monotonic()
+        if restante > 0:
+            raise APIIndisponivel(f"API indisponível, nova tentativa em {restante:.0f}s.")
+
+    def sucesso(self):
+        with self._lock:
+            self._falhas = 0
+
+    def falha(self):
+        with self._lock:
+            self._falhas += 1
+            if self._falhas >= self.falhas_maximas:
+                self._aberto_ate = time.monotonic() + self.pausa
+                self._falhas = 0
+
+
+_disjuntor = _Disjuntor(FALHAS_DISJUNTOR, PAUSA_DISJUNTOR)
+
+
+# Limita o número de requisições por segundo, somando todas as threads
+class LimiteTaxa:
+    def __init__(self, por_segundo):
+        self.intervalo = 1 / por_segundo if por_segundo > 0 else 0
+        self._proxima = time.monotonic()
+        self._lock = threading.Lock()
+
+    def aguardar(self):
+        with self._lock:
+            agora = time.monotonic()
+            espera = self._proxima - agora
+            self._proxima = max(agora, self._proxima) + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+
+# Limite de taxa do processo, aplicado a cada tentativa (None: sem limite)
+_limite = None
+
+
+# Função para limitar as requisições à API deste processo (por exemplo, no prefetch.py)
+def limitar_taxa(por_segundo):
+    global _limite
+    _limite = LimiteTaxa(por_segundo) if por_segundo and por_segundo > 0 else None
+
+
+# Espera antes da próxima tentativa: backoff exponencial com jitter completo
+def _espera(tentativa):
+    return random.uniform(0, min(BACKOFF_MAXIMO, BACKOFF_INICIAL * 2 ** tentativa))
+
+
+# Segundos pedidos pelo cabeçalho Retry-After (número ou data HTTP); None se ausente ou inválido
+def _retry_after(response):
+    valor = response.headers.get('Retry-After')
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# Função para fazer a requisição, repetindo em erros 5xx, limite de taxa (429)
+# e de conexão. Quando a API informa o Retry-After, a próxima tentativa espera
+# ao menos esse tempo (até a pausa do disjuntor).
+def _get(params):
+    _disjuntor.verificar()
+
+    with etapa('api', bytes=0, tentativas=0) as medicao:
+        aguardar = None
+        for tentativa in range(TENTATIVAS_API):
+            if tentativa:
+                espera = _espera(tentativa - 1)
+                if aguardar is not None:
+                    espera = max(espera, min(aguardar, PAUSA_DISJUNTOR))
+                time.sleep(espera)
+            aguardar = None
+            if _limite is not None:
+                _limite.aguardar()
+            medicao['tentativas'] += 1
+            try:
+                response = _session.get(URL_API, params=params,
+                                        timeout=(TIMEOUT_CONEXAO, TIMEOUT_LEITURA))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                erro = ErroAPI(f"falha de conexão ({e.__class__.__name__})")
+                continue
+
+            medicao['bytes'] += len(response.content)
+            medicao['status'] = response.status_code
+            if response.status_code >= 500 or response.status_code == 429:
+                erro = ErroAPI(f"status {response.status_code}")
+                aguardar = _retry_after(response)
+                continue
+            if response.status_code != 200:
+                # Os demais erros 4xx não se resolvem repetindo a requisição
+                _disjuntor.sucesso()
+                raise ErroAPI(f"status {response.status_code}")
+
+            # Corpo truncado ou que não é a lista de semanas: tenta de novo
+            try:
+                data = response.json()
+            except ValueError:
+                erro = ErroAPI("resposta inválida (JSON malformado)")
+                continue
+            if not isinstance(data, list):
+                erro = ErroAPI("resposta inválida (formato inesperado)")
+                continue
+
+            _disjuntor.sucesso()
+            medicao['linhas'] = len(data)
+            return data
+
+    _disjuntor.falha()
+    raise erro
+
+
+# Parâmetros da requisição ao alertcity (intervalo de (ey_start, ew_start) a (ey_end, ew_end))
+def _parametros(geocode, disease, ew_start, ew_end, ey_start, ey_end):
+    return {
+        'geocode': geocode,
+        'disease': disease.lower(),
+        'format': 'json',
+        'ew_start': ew_start,
+        'ew_end': ew_end,
+        'ey_start': ey_start,
+        'ey_end': ey_end,
+    }
+
+
+# Função para buscar a série do alertcity direto na API, sem passar pelo cache
+def requisitar_alertcity(geocode, disease, ew_start, ew_end, ey_start, ey_end):
+    return _get(_parametros(geocode, disease, ew_start, ew_end, ey_start, ey_end))
+
+
+# Função para buscar a série do alertcity, usando o cache local quando possível
+def buscar_alertcity(geocode, disease, ew_start, ew_end, ey_start, ey_end):
+    with etapa('cache_api') as medicao:
+        cached = cache_api.obter(geocode, disease, ew_start, ew_end, ey_start, ey_end)
+        medicao['cache'] = 'falta' if cached is None else 'acerto'
+    if cached is not None:
+        return cached
+
+    data = requisitar_alertcity(geocode, disease, ew_start, ew_end, ey_start, ey_end)
+    cache_api.salvar(geocode, disease, ew_start, ew_end, ey_start, ey_end, data)
+    return data
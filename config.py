@@ -0,0 +1,66 @@
+import os
+
+# Configurações da aplicação, ajustáveis por variáveis de ambiente
+
+# Diretório dos dados locais (cache das respostas da API)
+DIRETORIO_CACHE = os.environ.get('ARBOVIROSE_CACHE', '.cache')
+
+# Validade, em segundos, das respostas que incluem o ano corrente.
+# Anos já encerrados não mudam e ficam no cache sem expirar.
+TTL_ANO_CORRENTE = int(os.environ.get('ARBOVIROSE_TTL_ANO_CORRENTE', 6 * 60 * 60))
+
+# Cliente HTTP da API Info Dengue
+# (aponte para o simulador_api.py para rodar sem rede ou em testes de carga)
+URL_API = os.environ.get('ARBOVIROSE_URL_API', 'https://info.dengue.mat.br/api/alertcity')
+TIMEOUT_CONEXAO = float(os.environ.get('ARBOVIROSE_TIMEOUT_CONEXAO', 3.05))
+TIMEOUT_LEITURA = float(os.environ.get('ARBOVIROSE_TIMEOUT_LEITURA', 30))
+# Tentativas por requisição (ao menos uma)
+TENTATIVAS_API = max(1, int(os.environ.get('ARBOVIROSE_TENTATIVAS_API', 3)))
+BACKOFF_INICIAL = float(os.environ.get('ARBOVIROSE_BACKOFF_INICIAL', 0.5))
+BACKOFF_MAXIMO = float(os.environ.get('ARBOVIROSE_BACKOFF_MAXIMO', 8))
+CONEXOES_API = int(os.environ.get('ARBOVIROSE_CONEXOES_API', 16))
+
+# Após FALHAS_DISJUNTOR chamadas seguidas com erro, a API deixa de ser
+# chamada por PAUSA_DISJUNTOR segundos
+FALHAS_DISJUNTOR = int(os.environ.get('ARBOVIROSE_FALHAS_DISJUNTOR', 5))
+PAUSA_DISJUNTOR = float(os.environ.get('ARBOVIROSE_PAUSA_DISJUNTOR', 60))
+
+# Sincronização incremental das séries históricas
+ANO_INICIAL_SERIE = int(os.environ.get('ARBOVIROSE_ANO_INICIAL_SERIE', 2014))
+# Semanas mais recentes que são buscadas de novo, pois a API revisa os casos
+SEMANAS_REVISAO = int(os.environ.get('ARBOVIROSE_SEMANAS_REVISAO', 4))
+
+# Cache de modelos treinados: quantos ficam em memória (LRU) e em disco
+MODELOS_EM_MEMORIA = int(os.environ.get('ARBOVIROSE_MODELOS_EM_MEMORIA', 32))
+MODELOS_EM_DISCO = int(os.environ.get('ARBOVIROSE_MODELOS_EM_DISCO', 2000))
+
+# Random Forest: núcleos usados no treinamento e na previsão de cada modelo.
+# O padrão é limitado para que sessões simultâneas do Streamlit não disputem
+# todos os núcleos do servidor (-1 usa todos).
+RF_N_JOBS = int(os.environ.get('ARBOVIROSE_RF_N_JOBS', min(4, os.cpu_count() or 1)))
+# Menos árvores ou menor profundidade deixam o treinamento mais rápido,
+# com pequena perda de precisão
+RF_N_ESTIMATORS = int(os.environ.get('ARBOVIROSE_RF_N_ESTIMATORS', 100))
+RF_MAX_DEPTH = int(os.environ['ARBOVIROSE_RF_MAX_DEPTH']) if os.environ.get('ARBOVIROSE_RF_MAX_DEPTH') else None
+
+# Quantas semanas à frente a previsão recursiva alcança
+HORIZONTE_PREVISAO = int(os.environ.get('ARBOVIROSE_HORIZONTE_PREVISAO', 52))
+
+# Atualização incremental dos modelos quando chegam semanas novas: até quantas
+# semanas novas e quantas atualizações seguidas antes de um treinamento completo
+# (que também refaz a validação walk-forward)
+MAX_SEMANAS_ATUALIZACAO = int(os.environ.get('ARBOVIROSE_MAX_SEMANAS_ATUALIZACAO', 8))
+MAX_ATUALIZACOES = int(os.environ.get('ARBOVIROSE_MAX_ATUALIZACOES', 12))
+# Árvores novas acrescentadas à Random Forest a cada atualização
+RF_ARVORES_ATUALIZACAO = int(os.environ.get('ARBOVIROSE_RF_ARVORES_ATUALIZACAO', 10))
+# Fração da Random Forest que as atualizações podem substituir antes de um
+# treinamento completo (as árvores novas só veem as semanas mais recentes)
+RF_FRACAO_ATUALIZADA = float(os.environ.get('ARBOVIROSE_RF_FRACAO_ATUALIZADA', 0.5))
+
+# Instrumentação das etapas (metricas.py): ARBOVIROSE_METRICAS_LOG=1 registra as
+# medições de cada execução como JSON no log; ARBOVIROSE_METRICAS_ARQUIVO grava os
+# totais no formato do Prometheus (para o textfile collector do node_exporter);
+# ARBOVIROSE_PAINEL_DESEMPENHO=1 exibe as medições na barra lateral
+METRICAS_LOG = os.environ.get('ARBOVIROSE_METRICAS_LOG') == '1'
+METRICAS_ARQUIVO = os.environ.get('ARBOVIROSE_METRICAS_ARQUIVO') or None
+PAINEL_DESEMPENHO = os.environ.get('ARBOVIROSE_PAINEL_DESEMPENHO') == '1'
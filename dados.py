@@ -1,36 +1,83 @@
 import streamlit as st
-import pydeck as pdk
-import json
-import requests
+import numpy as np
 import pandas as pd
+import pydeck as pdk
 import plotly.graph_objects as go
 from datetime import datetime
-
-# Função para buscar dados do JSON localmente ou via URL
+from concurrent.futures import ThreadPoolExecutor
+
+from cliente_api import ErroAPI, buscar_alertcity
+from calendario import semanas_no_ano
+from config import PAINEL_DESEMPENHO
+from graficos import CORES_ARBOVIROSES, ESTILO_MAPA, figura_casos, visao_brasil
+from incidencia import cores_incidencia, incidencia_municipios, legenda
+from ingestao import alertcity_para_dataframe
+from metricas import etapa, execucao, exibir_painel, submeter
+from municipios import carregar_catalogo, nivel_do_zoom
+from sincronizacao import serie_local
+from transporte import TIPO_ARROW, coluna_binaria, deck_compacto, tabela_arrow
+
+# Função para obter o catálogo de municípios compartilhado pelo processo
 def fetch_data():
     try:
-        with open('allmun.json', 'r') as file:
-            return json.load(file)
+        return carregar_catalogo()
     except FileNotFoundError:
         st.error("Arquivo allmun.json não encontrado.")
         return None
 
-# Função para buscar dados da API
+# Pool compartilhado para buscar as doenças selecionadas em paralelo,
+# limitando o total de requisições simultâneas do processo
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='alertcity')
+
+# Função para montar a camada com a incidência por 100 mil habitantes de todos
+# os municípios, a partir das séries locais (sem chamar a API)
+def incidence_layer(catalogo, disease, year, week, nivel):
+    casos, incidencia = incidencia_municipios(catalogo, disease, year, week)
+    cores, limites = cores_incidencia(incidencia)
+
+    # Geometrias de todos os municípios já montadas no nível pedido; a cada
+    # execução só as propriedades são refeitas
+    geometrias = catalogo.geometrias(nivel)
+    casos_texto = ['-' if np.isnan(valor) else f'{valor:.0f}' for valor in casos]
+    incidencia_texto = ['-' if np.isnan(valor) else f'{valor:.1f}' for valor in incidencia]
+    features = [{
+        "type": "Feature",
+        "geometry": {"type": "MultiPolygon", "coordinates": coordenadas},
+        "properties": {"nome": nome, "casos": casos_municipio, "incidencia": incidencia_municipio, "cor": cor},
+    } for nome, coordenadas, casos_municipio, incidencia_municipio, cor
+        in zip(catalogo.nomes, geometrias, casos_texto, incidencia_texto, cores.tolist())]
+
+    layer = pdk.Layer(
+        "GeoJsonLayer",
+        data={"type": "FeatureCollection", "features": features},
+        get_fill_color="properties.cor",
+        get_line_color=[120, 120, 120],
+        line_width_min_pixels=0.2,
+        pickable=True,
+    )
+    table = pd.DataFrame({
+        'geocode': catalogo.geocodes,
+        'municipio': catalogo.nomes,
+        'populacao': catalogo.populacao,
+        'casos': casos,
+        'incidencia_100mil': incidencia,
+    })
+    return layer, limites, table
+
+# Função para buscar dados do ano, lendo a série local quando ela já cobre
+# esse ano e a API (com cache) caso contrário.
+# Roda nas threads do pool, por isso os erros são exibidos por quem a chamou.
 def fetch_epidemiological_data(geocode, disease, year):
-    url = f"https://info.dengue.mat.br/api/alertcity?geocode={geocode}&disease={disease}&format=json&ew_start=1&ew_end=52&ey_start={year}&ey_end={year}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        st.error("Erro ao buscar dados da API.")
-        return None
+    local = serie_local(geocode, disease, year)
+    if local is not None:
+        return local
+    return buscar_alertcity(geocode, disease, 1, semanas_no_ano(year), year, year)
 
 def display_map():
-    data = fetch_data()
-    if data:
+    catalogo = fetch_data()
+    if catalogo:
         # Extraindo nomes de municípios para a sidebar
-        municipios = {feature['properties']['_id']: feature for feature in data['features']}
-        municipio_names = list(municipios.keys())
+        municipio_names = list(catalogo.nomes)
 
         # Verificando se "São Paulo - SP" está na lista de municípios
         default_municipio = "São Paulo - SP"
@@ -43,8 +90,8 @@ def display_map():
         selected_municipio = st.sidebar.selectbox("Município:", municipio_names, index=municipio_names.index(default_municipio))
 
         # Obtendo as coordenadas e a população do município selecionado
-        coordinates = municipios[selected_municipio]['geometry']['coordinates']
-        populacao = municipios[selected_municipio]['properties']['populacao']  # Extraindo a população
+        atributos = catalogo.atributos(selected_municipio)
+        populacao = atributos['populacao']  # Extraindo a população
 
         # Adicionando um calendário para selecionar o ano, com 2024 como padrão
         current_year = datetime.now().year
@@ -57,7 +104,7 @@ def display_map():
         zika_checked = st.sidebar.checkbox("Zika", value=False)
 
         # Obtendo o cod_mun do município selecionado para usar como geocode na API
-        geocode = municipios[selected_municipio]['properties']['cod_mun']
+        geocode = atributos['cod_mun']
 
         # Dicionário para armazenar os dados das doenças selecionadas
         disease_map = {
@@ -66,122 +113,129 @@ def display_map():
             "Zika": zika_checked,
         }
 
-        # Inicializando a figura do gráfico e o dicionário total_cases
-        fig = go.Figure()
+        # Inicializando a figura do gráfico (eixos e rótulos das semanas já
+        # prontos para o ano) e o dicionário total_cases
+        fig = figura_casos(selected_year)
         total_cases = {disease: 0 for disease in disease_map if disease_map[disease]}
 
-        # Cores para cada doença
-        colors = {
-            "Dengue": 'black',
-            "Zika": 'orange',
-            "Chikungunya": 'red'
+        # Buscando todas as doenças selecionadas ao mesmo tempo (as medições
+        # das threads do pool entram no coletor desta execução)
+        futures = {
+            disease: submeter(_executor, fetch_epidemiological_data, geocode, disease.lower(), selected_year)
+            for disease, is_checked in disease_map.items() if is_checked
         }
 
-        # Coletando dados de cada doença selecionada e adicionando ao gráfico
-        for disease, is_checked in disease_map.items():
-            if is_checked:
-                epidemiological_data = fetch_epidemiological_data(geocode, disease.lower(), selected_year)
-                if epidemiological_data:
-                    df = pd.DataFrame(epidemiological_data)
+        # Adicionando ao gráfico os dados de cada doença, na ordem das checkboxes
+        export_frames = []
+        for disease, future in futures.items():
+            try:
+                epidemiological_data = future.result()
+            except ErroAPI as e:
+                st.error(f"Erro ao buscar dados da API: {e}")
+                continue
+
+            if epidemiological_data:
+                df = alertcity_para_dataframe(epidemiological_data)
 
-                    # Extraindo a semana do formato SE (ex: 202350)
-                    df['Semana'] = df['SE'].astype(str).str[-2:].astype(int)
+                # Colunas com tipo compacto, enviadas em binário ao navegador
+                weeks = coluna_binaria(df['Semana'], np.int16)
+                casos = coluna_binaria(df['Casos'], np.float32)  # Usando casos para Dengue, Zika e Chikungunya (NaN: sem dado)
+                export_frames.append(df.assign(Arbovirose=disease))
 
-                    weeks = df['Semana'].tolist()
-                    casos = df['casos'].tolist()  # Usando casos para Dengue, Zika e Chikungunya
-                    
-                    fig.add_trace(go.Scatter(x=weeks, y=casos,
-                                             mode='lines+markers',
-                                             name=disease,
-                                             line=dict(color=colors[disease])))  # Usando linhas para doenças
+                fig.add_trace(go.Scatter(x=weeks, y=casos,
+                                         mode='lines+markers',
+                                         name=disease,
+                                         line=dict(color=CORES_ARBOVIROSES[disease])))  # Usando linhas para doenças
 
-                    # Somando os casos totais para cada doença selecionada (apenas doenças com linha)
-                    total_cases[disease] += sum(casos)
+                # Somando os casos totais para cada doença selecionada (apenas doenças com linha)
+                total_cases[disease] += int(np.nansum(casos))
 
         # Criar um título que inclui o total de casos para cada doença e o nome do município
         title_cases = ', '.join([f"{disease}: {total_cases[disease]}" for disease in total_cases if total_cases[disease] > 0])
         
-        fig.update_layout(title=f'Casos em {selected_municipio} - {selected_year} - {title_cases}',
-                          xaxis_title='Semana Epidemiológica',
-                          yaxis_title='Casos',
-                          legend_title='Arboviroses')
-
-        # Definindo os rótulos das semanas no formato "01 - Jan"
-        month_mapping = {1: 'Jan', 2: 'Fev', 3: 'Mar', 4: 'Abr', 
-                         5: 'Mai', 6: 'Jun', 7: 'Jul', 
-                         8: 'Ago', 9: 'Set', 
-                         10: 'Out', 11: 'Nov', 12: 'Dez'}
-        
-        week_labels = []
-        
-        for week in range(1, 53):
-            if week <= 4:
-                month_number = 1  # Janeiro
-            elif week <= 8:
-                month_number = 2  # Fevereiro
-            elif week <= 13:
-                month_number = 3  # Março
-            elif week <= 17:
-                month_number = 4  # Abril
-            elif week <= 22:
-                month_number = 5  # Maio
-            elif week <= 26:
-                month_number = 6  # Junho
-            elif week <= 30:
-                month_number = 7  # Julho
-            elif week <= 35:
-                month_number = 8  # Agosto
-            elif week <= 39:
-                month_number = 9  # Setembro
-            elif week <= 43:
-                month_number = 10 # Outubro
-            elif week <= 48:
-                month_number = 11 # Novembro
-            else:
-                month_number = 12 # Dezembro
-
-            week_labels.append(f'{week:02} - {month_mapping[month_number]}')
-
-        # Atualizando o eixo x com ticks e labels corretos.
-        fig.update_xaxes(tickvals=list(range(1, 53)), ticktext=week_labels)
+        fig.update_layout(title=dict(text=f'Casos em {selected_municipio} - {selected_year} - {title_cases}'))
 
         # Exibindo o gráfico no Streamlit acima do mapa.
-        st.plotly_chart(fig)
+        with etapa('grafico'):
+            st.plotly_chart(fig)
+
+        # Exportação das séries do gráfico em Arrow, gerada só quando o botão é clicado
+        if export_frames:
+            st.download_button("Baixar dados (Arrow)", data=lambda: tabela_arrow(pd.concat(export_frames)),
+                               file_name=f"casos_{geocode}_{selected_year}.arrow", mime=TIPO_ARROW,
+                               on_click="ignore")
 
         # Exibindo a população abaixo do gráfico.
         st.markdown(f"##### População de {selected_municipio}: {populacao}")
 
-        # Criando a camada do polígono com pydeck.
+        view_state = visao_brasil()
+
+        # Mapa do município selecionado ou da incidência em todos os municípios
+        map_view = st.sidebar.radio("Mapa:", ["Município selecionado", "Incidência nos municípios"])
+        nivel = nivel_do_zoom(view_state.zoom)
+
+        # Criando a camada do polígono com pydeck, com a geometria simplificada
+        # no nível de detalhe que o zoom do mapa consegue mostrar. Sobre a
+        # incidência, o município selecionado aparece só com o contorno.
         polygon_layer = pdk.Layer(
             "GeoJsonLayer",
             data={"type": "FeatureCollection", "features": [{
                 "type": "Feature",
                 "geometry": {
                     "type": "MultiPolygon",
-                    "coordinates": coordinates,
+                    "coordinates": catalogo.geometria(selected_municipio, nivel),
                 }
             }]},
+            filled=map_view == "Município selecionado",
             get_fill_color=[255,0,0],   # Cor do preenchimento (vermelho)
             get_line_color=[0,0,0],     # Cor da linha (preto)
             line_width_min_pixels=2,
             opacity=0.5,
-            pickable=True,
-        )
-
-        view_state = pdk.ViewState(
-            latitude=-14.2350,
-            longitude=-51.9253,
-            zoom=3.1,
-            pitch=0,
+            pickable=map_view == "Município selecionado",
         )
 
-        deck = pdk.Deck(
-            layers=[polygon_layer],
+        layers = [polygon_layer]
+        tooltip = True
+        if map_view == "Incidência nos municípios":
+            map_disease = st.sidebar.selectbox("Arbovirose do mapa:", list(disease_map))
+            map_week = st.sidebar.selectbox("Semana do mapa:",
+                                            ["Ano inteiro"] + list(range(1, semanas_no_ano(selected_year) + 1)))
+            week = None if map_week == "Ano inteiro" else map_week
+
+            layer, limites, table = incidence_layer(catalogo, map_disease, selected_year, week, nivel)
+            with_data = int(table['casos'].notna().sum())
+            layers = [layer, polygon_layer]
+            tooltip = {"html": "<b>{nome}</b><br/>Casos: {casos}<br/>Incidência: {incidencia} por 100 mil hab."}
+
+            period = f"{selected_year}" if week is None else f"semana {week} de {selected_year}"
+            st.markdown(f"##### Incidência de {map_disease} por 100 mil habitantes - {period}")
+            st.markdown(" ".join(
+                f"<span style='display: inline-block; width: 12px; height: 12px; margin: 0 4px 0 12px; "
+                f"background: rgb({cor[0]}, {cor[1]}, {cor[2]});'></span>{rotulo}"
+                for cor, rotulo in legenda(limites)
+            ), unsafe_allow_html=True)
+            if with_data < len(catalogo):
+                st.caption(f"{with_data} de {len(catalogo)} municípios com dados locais. "
+                           "Os demais podem ser baixados com o prefetch.py.")
+            st.download_button("Baixar incidência (Arrow)", data=lambda: tabela_arrow(table),
+                               file_name=f"incidencia_{map_disease.lower()}_{selected_year}"
+                                         f"{'' if week is None else f'_{week:02}'}.arrow",
+                               mime=TIPO_ARROW, on_click="ignore")
+
+        deck = deck_compacto(
+            layers=layers,
             initial_view_state=view_state,
-            map_style='mapbox://styles/mapbox/light-v11',
+            map_style=ESTILO_MAPA,
+            tooltip=tooltip,
         )
 
-        st.pydeck_chart(deck)
+        with etapa('mapa'):
+            st.pydeck_chart(deck)
 
-# Chama a função principal para exibir o mapa e gráficos na aplicação Streamlit.
-display_map()
+# Executado diretamente (streamlit run dados.py), exibe apenas o mapa e os gráficos.
+# Importado pelo main.py, não executa nada.
+if __name__ == '__main__':
+    with execucao("Dados arboviroses") as coletor:
+        display_map()
+    if PAINEL_DESEMPENHO:
+        exibir_painel(coletor)
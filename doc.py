@@ -53,7 +53,7 @@ As funcionalidades do arquivo main.py são:
              
 - **Sidebar**: Exibe uma imagem relacionada a arboviroses e inclui links para um repositório do GitHub e para o site Info Dengue.
              
-**Abas**: Cria três abas:
+**Navegação**: Cria três páginas, e apenas a página selecionada é executada:
              
 - **Dados Arboviroses**: Chama uma função para exibir um mapa.
 - **Previsão de Casos**: Chama uma função para mostrar previsões.
@@ -368,8 +368,8 @@ Configuração da Página: Define o layout como amplo para melhor visualização
 Funções Principais:
              
 Carregar Dados: Lê dados de um arquivo JSON local e busca dados epidemiológicos de uma API.
-Simulação de Dados Futuros: Gera dados simulados para temperatura, umidade e taxa de reprodução (Rt).
-Previsão: Permite ao usuário selecionar município e doença, treina um modelo (Random Forest ou Regressão Linear) com dados históricos, e faz previsões para o futuro.
+Variáveis Defasadas: Cada semana é descrita pelos casos das semanas anteriores, pela temperatura, umidade e taxa de reprodução (Rt) da semana anterior e pela sazonalidade.
+Previsão: Permite ao usuário selecionar município e doença, treina um modelo (Random Forest ou Regressão Linear) com dados históricos, avalia o modelo com validação walk-forward (treinando só com o passado de cada origem) e prevê recursivamente as próximas semanas a partir da última semana observada.
 Visualização Interativa: Exibe gráficos que comparam dados históricos com previsões futuras, permitindo que os usuários analisem diferentes cenários.
             
     """)
@@ -0,0 +1,84 @@
+from functools import lru_cache
+from types import MappingProxyType
+
+import numpy as np
+import plotly.graph_objects as go
+
+from calendario import compor_se, inicio_semanas, semanas_no_ano
+
+# Partes fixas dos gráficos e do mapa (eixos, marcas, layout, visão inicial),
+# montadas e validadas uma única vez por processo. A cada execução, os gráficos
+# partem de uma cópia do layout pronto, sem validá-lo de novo (a validação do
+# template do Plotly é a parte mais cara da montagem), e só recebem os dados.
+
+MESES = ('Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez')
+
+# Cores de cada arbovirose nos gráficos
+CORES_ARBOVIROSES = MappingProxyType({
+    "Dengue": 'black',
+    "Zika": 'orange',
+    "Chikungunya": 'red',
+})
+
+# Mapa base: visão do Brasil inteiro
+ESTILO_MAPA = 'mapbox://styles/mapbox/light-v11'
+
+
+# Rótulos "01 - Jan" das semanas epidemiológicas do ano (52 ou 53). O mês de
+# cada semana é o da sua quarta-feira, que tem a maioria dos dias da semana.
+@lru_cache(maxsize=None)
+def rotulos_semanas(ano):
+    semanas = np.arange(1, semanas_no_ano(ano) + 1)
+    quartas = inicio_semanas(compor_se(ano, semanas)) + 3
+    meses = quartas.astype('datetime64[M]').astype(np.int64) % 12
+    return tuple(f'{semana:02} - {MESES[mes]}' for semana, mes in zip(semanas.tolist(), meses.tolist()))
+
+
+# Layouts validados, guardados como dicionários
+@lru_cache(maxsize=None)
+def _layout_casos(ano):
+    fig = go.Figure()
+    fig.update_layout(xaxis_title='Semana Epidemiológica',
+                      yaxis_title='Casos',
+                      legend_title='Arboviroses')
+    rotulos = rotulos_semanas(ano)
+    fig.update_xaxes(tickvals=np.arange(1, len(rotulos) + 1), ticktext=list(rotulos))
+    return fig.layout.to_plotly_json()
+
+
+@lru_cache(maxsize=None)
+def _layout_previsao(semanas):
+    fig = go.Figure()
+    fig.update_layout(
+        xaxis_title="Semana Epidemiológica",
+        yaxis_title="Número de Casos",
+        legend_title="Anos",
+        template="plotly_white",
+        height=600,
+    )
+    fig.update_xaxes(tickvals=np.arange(1, semanas + 1), ticktext=[str(i) for i in range(1, semanas + 1)])
+    return fig.layout.to_plotly_json()
+
+
+# Gráfico vazio dos casos semanais de um ano, com as semanas rotuladas pelo mês
+def figura_casos(ano):
+    return go.Figure(layout=_layout_casos(ano), _validate=False)
+
+
+# Gráfico vazio da previsão, com marcas nas semanas 1 a `semanas`
+def figura_previsao(semanas=52):
+    return go.Figure(layout=_layout_previsao(semanas), _validate=False)
+
+
+# Visão inicial do mapa (Brasil inteiro), compartilhada por todos os mapas.
+# O pydeck só é importado pela página do mapa.
+@lru_cache(maxsize=None)
+def visao_brasil():
+    import pydeck as pdk
+
+    return pdk.ViewState(
+        latitude=-14.2350,
+        longitude=-51.9253,
+        zoom=3.1,
+        pitch=0,
+    )
@@ -0,0 +1,69 @@
+import numpy as np
+
+from sincronizacao import casos_por_municipio
+
+# Paleta sequencial (amarelo a vermelho): a primeira cor é a dos municípios sem
+# casos e as demais são as classes de incidência, divididas por quantis
+PALETA = np.array([
+    [255, 255, 204],
+    [254, 217, 118],
+    [254, 178, 76],
+    [253, 141, 60],
+    [252, 78, 42],
+    [227, 26, 28],
+    [177, 0, 38],
+], dtype=np.uint8)
+# Cor dos municípios sem dados na série local
+SEM_DADOS = np.array([200, 200, 200], dtype=np.uint8)
+OPACIDADE = 200
+
+
+# Função para calcular os casos e a incidência por 100 mil habitantes de todos
+# os municípios, alinhados às linhas do catálogo (NaN quando não há dados locais)
+def incidencia_municipios(catalogo, disease, ano, semana=None):
+    linhas = casos_por_municipio(disease, ano, semana)
+    casos = np.full(len(catalogo), np.nan)
+    if linhas:
+        geocodes = np.array([geocode for geocode, _ in linhas], dtype=np.int64)
+        valores = np.array([np.nan if total is None else total for _, total in linhas], dtype=np.float64)
+
+        # Junção pelo geocódigo: posição de cada geocódigo no catálogo
+        ordem = np.argsort(catalogo.geocodes)
+        posicao = np.minimum(np.searchsorted(catalogo.geocodes, geocodes, sorter=ordem), len(ordem) - 1)
+        encontrados = catalogo.geocodes[ordem[posicao]] == geocodes
+        casos[ordem[posicao[encontrados]]] = valores[encontrados]
+
+    populacao = catalogo.populacao.astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        incidencia = np.where(populacao > 0, casos / populacao * 100_000, np.nan)
+    return casos, incidencia
+
+
+# Função para classificar as incidências: devolve a cor RGBA de cada município
+# e os limites das classes (quantis das incidências positivas)
+def cores_incidencia(incidencia):
+    positivas = incidencia[incidencia > 0]
+    classes = len(PALETA) - 1
+    if len(positivas):
+        limites = np.unique(np.quantile(positivas, np.arange(1, classes) / classes))
+    else:
+        limites = np.empty(0)
+
+    classe = np.where(incidencia > 0, np.searchsorted(limites, incidencia, side='right') + 1, 0)
+    cores = np.where(np.isnan(incidencia)[:, None], SEM_DADOS, PALETA[classe])
+    opacidade = np.full((len(incidencia), 1), OPACIDADE, dtype=np.uint8)
+    return np.hstack([cores, opacidade]), limites
+
+
+# Rótulos da legenda, um por cor da paleta usada
+def legenda(limites):
+    itens = [(PALETA[0], "Sem casos")]
+    bordas = [0.0, *limites.tolist()]
+    for indice, inicio in enumerate(bordas):
+        if indice + 1 < len(bordas):
+            rotulo = f"{inicio:.1f} a {bordas[indice + 1]:.1f}"
+        else:
+            rotulo = f"Acima de {inicio:.1f}"
+        itens.append((PALETA[indice + 1], rotulo))
+    itens.append((SEM_DADOS, "Sem dados locais"))
+    return itens
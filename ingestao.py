@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from calendario import decompor_se
+from metricas import etapa
+
+# Colunas do alertcity usadas pela aplicação e seus nomes no DataFrame
+COLUNAS_ALERTCITY = {
+    'casos': 'Casos',
+    'tempmed': 'Temp Média',
+    'umidmed': 'Umidade Média',
+    'Rt': 'Rt',
+    'pop': 'População',
+}
+
+# Tipos compactos de cada coluna. Casos e população ficam em float32 (exato
+# até 16,7 milhões) para que os valores ausentes continuem NaN, em vez de virar
+# semanas com zero casos.
+TIPOS = {
+    'Ano': np.int16,
+    'Semana': np.int16,
+    'Casos': np.float32,
+    'Temp Média': np.float32,
+    'Umidade Média': np.float32,
+    'Rt': np.float32,
+    'População': np.float32,
+}
+
+
+# Função para converter os registros do alertcity em um DataFrame tipado,
+# ordenado por semana epidemiológica e só com as colunas usadas
+def alertcity_para_dataframe(registros):
+    with etapa('ingestao', linhas=len(registros)):
+        return _para_dataframe(registros)
+
+
+def _para_dataframe(registros):
+    bruto = pd.DataFrame.from_records(registros, columns=['SE', *COLUNAS_ALERTCITY])
+    se = bruto['SE'].to_numpy(dtype=np.int64)
+    ordem = np.argsort(se, kind='stable')
+
+    anos, semanas = decompor_se(se)
+    colunas = {
+        'Ano': anos,
+        'Semana': semanas,
+    }
+    for origem, destino in COLUNAS_ALERTCITY.items():
+        colunas[destino] = pd.to_numeric(bruto[origem], errors='coerce').to_numpy(dtype=np.float64)
+
+    return pd.DataFrame({
+        nome: valores[ordem].astype(TIPOS[nome]) for nome, valores in colunas.items()
+    })
@@ -1,16 +1,15 @@
 import streamlit as st
 import locale
 
+from config import PAINEL_DESEMPENHO
+from metricas import execucao, exibir_painel
+
 # Tenta definir a localidade para português do Brasil
 try:
     locale.setlocale(locale.LC_TIME, 'pt_BR.UTF-8')
 except locale.Error:
     locale.setlocale(locale.LC_TIME, 'C')  # Usa uma localidade padrão se falhar
 
-from dados import display_map  # Supondo que você tenha um módulo chamado dados
-from doc import display_doc     # Supondo que você tenha um módulo chamado doc
-from previsao import display_forecast  # Importa a função do arquivo previsao.py
-
 # Configuração da página para layout amplo
 st.set_page_config(layout='wide')
 
@@ -26,20 +25,31 @@ st.sidebar.markdown(
     unsafe_allow_html=True
 )
 
-# Criando abas para Dados arboviroses, Previsão de casos e Documentação no topo da página
-tab1, tab2, tab3 = st.tabs(["Dados arboviroses", "Previsão de casos", "Documentação"])
+# Navegação entre Dados arboviroses, Previsão de casos e Documentação no topo da página.
+# Só a página selecionada é executada, e os módulos de cada página (pydeck,
+# scikit-learn...) são importados apenas quando ela é aberta pela primeira vez.
+pagina = st.radio("Página", ["Dados arboviroses", "Previsão de casos", "Documentação"],
+                  horizontal=True, label_visibility="collapsed")
+
+# As etapas de cada execução da página são medidas (ver metricas.py)
+with execucao(pagina) as coletor:
+    if pagina == "Dados arboviroses":
+        from dados import display_map
+        st.markdown("<h1 style='font-size: 30px;'></h1>", unsafe_allow_html=True)
+        display_map()  # Chama a função que exibe o mapa
 
-with tab1:
-    st.markdown("<h1 style='font-size: 30px;'></h1>", unsafe_allow_html=True)
-    display_map()  # Chama a função que exibe o mapa
+    elif pagina == "Previsão de casos":
+        from previsao import display_forecast
+        display_forecast()
 
-with tab2:
-    # Chama a função que exibe a previsão apenas quando a aba é acessada
-    display_forecast()  
+    elif pagina == "Documentação":
+        from doc import display_doc
+        st.markdown("<h1 style='font-size: 30px;'>Documentação</h1>", unsafe_allow_html=True)
+        display_doc()
 
-with tab3:
-    st.markdown("<h1 style='font-size: 30px;'>Documentação</h1>", unsafe_allow_html=True)
-    display_doc()
+# Painel de desempenho opcional, com as medições desta execução
+if PAINEL_DESEMPENHO:
+    exibir_painel(coletor)
 
 # Adicionando logo do GitHub e link na parte inferior do sidebar
 st.sidebar.markdown(
@@ -0,0 +1,194 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from config import METRICAS_LOG, METRICAS_ARQUIVO
+
+# Instrumentação das etapas do painel (leitura do allmun.json, requisições à
+# API, agrupamentos, treinamento, gráficos...). Cada etapa registra o tempo e,
+# quando fizer sentido, os bytes recebidos, as linhas processadas e se o
+# resultado veio do cache. As medições de cada execução (rerun) de uma página
+# são juntadas por um coletor guardado numa ContextVar; fora de uma execução
+# (nos scripts de linha de comando) só os totais do processo são atualizados.
+
+_coletor = contextvars.ContextVar('coletor_metricas', default=None)
+
+_logger = logging.getLogger('arbovirose.metricas')
+if METRICAS_LOG:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    _logger.addHandler(_handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+
+# Totais acumulados pelo processo, exportados no formato do Prometheus
+_totais = {}
+_execucoes = {}
+_lock_totais = threading.Lock()
+
+
+# Medições de uma execução de uma página
+class Coletor:
+    def __init__(self, pagina):
+        self.pagina = pagina
+        self.inicio = time.perf_counter()
+        self.segundos = None
+        self.medicoes = []
+        self._lock = threading.Lock()
+
+    def adicionar(self, medicao):
+        with self._lock:
+            self.medicoes.append(medicao)
+
+    # Totais por etapa, na ordem em que cada etapa apareceu pela primeira vez
+    def resumo(self):
+        resumo = {}
+        with self._lock:
+            medicoes = list(self.medicoes)
+        for medicao in medicoes:
+            linha = resumo.setdefault(medicao['etapa'], {
+                'execuções': 0, 'segundos': 0.0, 'bytes': 0, 'linhas': 0, 'acertos cache': 0, 'faltas cache': 0,
+            })
+            linha['execuções'] += 1
+            linha['segundos'] += medicao.get('segundos', 0.0)
+            linha['bytes'] += medicao.get('bytes') or 0
+            linha['linhas'] += medicao.get('linhas') or 0
+            if medicao.get('cache') == 'acerto':
+                linha['acertos cache'] += 1
+            elif medicao.get('cache') == 'falta':
+                linha['faltas cache'] += 1
+        return resumo
+
+
+def _registrar(medicao):
+    coletor = _coletor.get()
+    if coletor is not None:
+        coletor.adicionar(medicao)
+
+    with _lock_totais:
+        totais = _totais.setdefault(medicao['etapa'], {
+            'execucoes': 0, 'segundos': 0.0, 'bytes': 0, 'linhas': 0, 'acerto': 0, 'falta': 0,
+        })
+        totais['execucoes'] += 1
+        totais['segundos'] += medicao.get('segundos', 0.0)
+        totais['bytes'] += medicao.get('bytes') or 0
+        totais['linhas'] += medicao.get('linhas') or 0
+        if medicao.get('cache') in ('acerto', 'falta'):
+            totais[medicao['cache']] += 1
+
+
+# Mede o tempo do bloco como uma etapa. O dicionário devolvido recebe os demais
+# campos (bytes, linhas, cache='acerto'/'falta') conforme o bloco avança.
+@contextmanager
+def etapa(nome, **campos):
+    medicao = {'etapa': nome, **campos}
+    inicio = time.perf_counter()
+    try:
+        yield medicao
+    finally:
+        medicao['segundos'] = time.perf_counter() - inicio
+        _registrar(medicao)
+
+
+# Registra uma etapa sem medir tempo (por exemplo, um acerto de cache)
+def registrar(nome, **campos):
+    _registrar({'etapa': nome, 'segundos': 0.0, **campos})
+
+
+# Envia a função ao pool de threads levando o coletor da execução atual
+def submeter(executor, funcao, *args, **kwargs):
+    return executor.submit(contextvars.copy_context().run, funcao, *args, **kwargs)
+
+
+# Coleta as medições de uma execução da página e as exporta ao final
+@contextmanager
+def execucao(pagina):
+    coletor = Coletor(pagina)
+    token = _coletor.set(coletor)
+    try:
+        yield coletor
+    finally:
+        _coletor.reset(token)
+        coletor.segundos = time.perf_counter() - coletor.inicio
+        with _lock_totais:
+            totais = _execucoes.setdefault(pagina, {'execucoes': 0, 'segundos': 0.0})
+            totais['execucoes'] += 1
+            totais['segundos'] += coletor.segundos
+
+        if METRICAS_LOG:
+            _logger.info(json.dumps({
+                'evento': 'execucao',
+                'pagina': pagina,
+                'segundos': round(coletor.segundos, 6),
+                'etapas': coletor.medicoes,
+            }, ensure_ascii=False, default=str))
+        if METRICAS_ARQUIVO:
+            gravar_prometheus(METRICAS_ARQUIVO)
+
+
+def _rotulos(**rotulos):
+    return '{' + ','.join(f'{nome}="{valor}"' for nome, valor in rotulos.items()) + '}'
+
+
+# Função para exportar os totais do processo no formato texto do Prometheus
+def exportar_prometheus():
+    with _lock_totais:
+        totais = {etapa: dict(valores) for etapa, valores in _totais.items()}
+        execucoes = {pagina: dict(valores) for pagina, valores in _execucoes.items()}
+
+    linhas = []
+    metricas = [
+        ('arbovirose_etapa_execucoes_total', 'Vezes que a etapa foi executada', 'execucoes'),
+        ('arbovirose_etapa_segundos_total', 'Tempo total gasto na etapa, em segundos', 'segundos'),
+        ('arbovirose_etapa_bytes_total', 'Bytes recebidos na etapa', 'bytes'),
+        ('arbovirose_etapa_linhas_total', 'Linhas processadas na etapa', 'linhas'),
+    ]
+    for nome, ajuda, campo in metricas:
+        linhas += [f'# HELP {nome} {ajuda}', f'# TYPE {nome} counter']
+        linhas += [f'{nome}{_rotulos(etapa=etapa)} {valores[campo]}' for etapa, valores in totais.items()]
+
+    linhas += ['# HELP arbovirose_cache_total Consultas ao cache por resultado',
+               '# TYPE arbovirose_cache_total counter']
+    for etapa, valores in totais.items():
+        if valores['acerto'] or valores['falta']:
+            linhas += [f'arbovirose_cache_total{_rotulos(etapa=etapa, resultado=resultado)} {valores[resultado]}'
+                       for resultado in ('acerto', 'falta')]
+
+    linhas += ['# HELP arbovirose_execucoes_total Execuções de cada página',
+               '# TYPE arbovirose_execucoes_total counter']
+    linhas += [f'arbovirose_execucoes_total{_rotulos(pagina=pagina)} {valores["execucoes"]}'
+               for pagina, valores in execucoes.items()]
+    linhas += ['# HELP arbovirose_execucao_segundos_total Tempo total das execuções de cada página, em segundos',
+               '# TYPE arbovirose_execucao_segundos_total counter']
+    linhas += [f'arbovirose_execucao_segundos_total{_rotulos(pagina=pagina)} {valores["segundos"]}'
+               for pagina, valores in execucoes.items()]
+    return '\n'.join(linhas) + '\n'
+
+
+# Grava as métricas para o textfile collector do node_exporter (troca atômica do
+# arquivo; cada thread grava o seu temporário, pois as execuções são simultâneas)
+def gravar_prometheus(caminho):
+    temporario = f'{caminho}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporario, 'w') as file:
+        file.write(exportar_prometheus())
+    os.replace(temporario, caminho)
+
+
+# Função para exibir na barra lateral as medições da execução
+def exibir_painel(coletor):
+    import pandas as pd
+    import streamlit as st
+
+    with st.sidebar.expander("Desempenho", expanded=False):
+        st.caption(f"Execução de '{coletor.pagina}': {coletor.segundos * 1000:.0f} ms")
+        resumo = pd.DataFrame.from_dict(coletor.resumo(), orient='index')
+        if resumo.empty:
+            st.caption("Nenhuma etapa medida.")
+            return
+        resumo['ms'] = (resumo.pop('segundos') * 1000).round(1)
+        st.dataframe(resumo[['ms', 'execuções', 'bytes', 'linhas', 'acertos cache', 'faltas cache']])
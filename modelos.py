@@ -0,0 +1,218 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import joblib
+import pandas as pd
+
+from config import DIRETORIO_CACHE, MODELOS_EM_MEMORIA, MODELOS_EM_DISCO
+from metricas import etapa
+
+# Cache dos modelos treinados e das suas métricas de teste: os mais recentes
+# ficam em memória (LRU) e todos são gravados em disco com joblib
+DIRETORIO_MODELOS = os.path.join(DIRETORIO_CACHE, 'modelos')
+# Modelos pré-treinados pelo treinamento em lote (não são removidos pelo limite de disco)
+DIRETORIO_LOTE = os.path.join(DIRETORIO_CACHE, 'modelos_lote')
+# Modelos treinados pela previsão em lote (previsao_lote.py): separados do cache
+# do painel, para não tirar de lá os modelos dos usuários, e com o mesmo limite de disco
+DIRETORIO_PREVISOES_LOTE = os.path.join(DIRETORIO_CACHE, 'modelos_previsao_lote')
+DIRETORIOS_LIMITADOS = (DIRETORIO_MODELOS, DIRETORIO_PREVISOES_LOTE)
+DIRETORIOS_MODELOS = (DIRETORIO_MODELOS, DIRETORIO_LOTE, DIRETORIO_PREVISOES_LOTE)
+
+_lock = threading.Lock()
+_memoria = OrderedDict()
+# Locks por chave, para que só uma thread treine cada modelo: chave -> [lock, threads usando]
+_locks_chaves = {}
+
+
+# Versão dos dados de treinamento: muda sempre que algum valor muda
+def versao_dados(df):
+    valores = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha1(valores.tobytes()).hexdigest()[:16]
+
+
+# Versão do formato dos modelos: mudar quando as variáveis de entrada ou o
+# conteúdo dos artefatos mudarem, para que os artefatos antigos deixem de ser usados
+VERSAO_MODELOS = 5
+
+
+# Chave do modelo: município, doença, anos de treinamento, tipo de modelo e versão dos dados
+def chave_modelo(geocode, disease, anos, modelo, versao):
+    texto = f"v{VERSAO_MODELOS}|{int(geocode)}|{disease.lower()}|{','.join(map(str, sorted(anos)))}|{modelo}|{versao}"
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+
+# Chave da série de modelos: a mesma do modelo, sem a versão dos dados. Aponta
+# para o modelo mais recente, que pode ser atualizado quando chega uma semana nova.
+def chave_serie(geocode, disease, anos, modelo):
+    return chave_modelo(geocode, disease, anos, modelo, 'ultimo')
+
+
+def _caminho(chave, diretorio=DIRETORIO_MODELOS):
+    return os.path.join(diretorio, f'{chave}.joblib')
+
+
+def _guardar_em_memoria(chave, artefato):
+    with _lock:
+        _memoria[chave] = artefato
+        _memoria.move_to_end(chave)
+        while len(_memoria) > MODELOS_EM_MEMORIA:
+            _memoria.popitem(last=False)
+
+
+# Marca o uso do modelo no disco: a data de modificação passa a ser a do último
+# uso, e a limpeza remove os usados há mais tempo (LRU)
+def _marcar_uso(chave, diretorios=DIRETORIOS_LIMITADOS):
+    for diretorio in diretorios:
+        try:
+            os.utime(_caminho(chave, diretorio))
+        except FileNotFoundError:
+            pass
+
+
+# Remove os arquivos usados há mais tempo quando o disco passa do limite, e os
+# ponteiros .ultimo que apontam para modelos removidos. Outros processos podem
+# remover os mesmos arquivos ao mesmo tempo: os que sumiram no meio da limpeza
+# são ignorados.
+def _limpar_disco(diretorio=DIRETORIO_MODELOS):
+    arquivos = []
+    ponteiros = []
+    for entrada in os.scandir(diretorio):
+        if entrada.name.endswith('.joblib'):
+            try:
+                arquivos.append((entrada.stat().st_mtime, entrada.path))
+            except FileNotFoundError:
+                pass
+        elif entrada.name.endswith('.ultimo'):
+            ponteiros.append(entrada.path)
+    excesso = len(arquivos) - MODELOS_EM_DISCO
+    if excesso <= 0:
+        return
+    for _, caminho in sorted(arquivos)[:excesso]:
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+
+    for caminho in ponteiros:
+        try:
+            with open(caminho, 'r') as file:
+                chave = file.read().strip()
+            if not os.path.exists(_caminho(chave, diretorio)):
+                os.remove(caminho)
+        except FileNotFoundError:
+            pass
+
+
+# Função para obter um modelo do cache (memória, disco e modelos do lote); None se ausente
+def obter_modelo(chave):
+    with _lock:
+        artefato = _memoria.get(chave)
+        if artefato is not None:
+            _memoria.move_to_end(chave)
+    if artefato is not None:
+        _marcar_uso(chave)
+        return artefato
+
+    for diretorio in DIRETORIOS_MODELOS:
+        try:
+            artefato = joblib.load(_caminho(chave, diretorio))
+        except (FileNotFoundError, EOFError):
+            continue
+        if diretorio in DIRETORIOS_LIMITADOS:
+            _marcar_uso(chave, [diretorio])
+        _guardar_em_memoria(chave, artefato)
+        return artefato
+    return None
+
+
+# Lock exclusivo da chave, removido quando nenhuma thread o usa mais
+@contextmanager
+def _lock_chave(chave):
+    with _lock:
+        entrada = _locks_chaves.setdefault(chave, [threading.Lock(), 0])
+        entrada[1] += 1
+    try:
+        with entrada[0]:
+            yield
+    finally:
+        with _lock:
+            entrada[1] -= 1
+            if not entrada[1]:
+                del _locks_chaves[chave]
+
+
+def _gravar(caminho, gravar):
+    temporario = f'{caminho}.{os.getpid()}.{threading.get_ident()}.tmp'
+    gravar(temporario)
+    os.replace(temporario, caminho)
+
+
+# Função para gravar um modelo treinado no cache `diretorio` (ou, com lote=True,
+# entre os pré-treinados). Com `serie`, o modelo passa a ser o mais recente dessa série de modelos.
+def salvar_modelo(chave, artefato, lote=False, serie=None, diretorio=DIRETORIO_MODELOS):
+    if lote:
+        diretorio = DIRETORIO_LOTE
+    os.makedirs(diretorio, exist_ok=True)
+    _gravar(_caminho(chave, diretorio), lambda caminho: joblib.dump(artefato, caminho))
+    if serie:
+        def gravar_ponteiro(caminho):
+            with open(caminho, 'w') as file:
+                file.write(chave)
+        _gravar(os.path.join(diretorio, f'{serie}.ultimo'), gravar_ponteiro)
+    if lote:
+        return
+    _guardar_em_memoria(chave, artefato)
+    _limpar_disco(diretorio)
+
+
+# Função para obter o modelo mais recente de uma série de modelos; None se não houver
+def obter_ultimo_modelo(serie):
+    for diretorio in DIRETORIOS_MODELOS:
+        try:
+            with open(os.path.join(diretorio, f'{serie}.ultimo'), 'r') as file:
+                chave = file.read().strip()
+        except FileNotFoundError:
+            continue
+        artefato = obter_modelo(chave)
+        if artefato is not None:
+            return artefato
+    return None
+
+
+# Indica se já existe um modelo pré-treinado com esta chave
+def modelo_lote_existe(chave):
+    return os.path.exists(_caminho(chave, DIRETORIO_LOTE))
+
+
+# Data (timestamp) em que o modelo pré-treinado foi gravado
+def data_modelo_lote(chave):
+    return os.path.getmtime(_caminho(chave, DIRETORIO_LOTE))
+
+
+# Função para remover um modelo pré-treinado que foi substituído
+def remover_modelo_lote(chave):
+    try:
+        os.remove(_caminho(chave, DIRETORIO_LOTE))
+    except FileNotFoundError:
+        pass
+
+
+# Função para obter o modelo do cache ou treiná-lo (e guardá-lo) se não existir.
+# O modelo novo é gravado no cache `diretorio` (o do painel, por padrão).
+# Sessões que pedem o mesmo modelo ao mesmo tempo esperam um único treinamento.
+def obter_ou_treinar(chave, treinar, serie=None, diretorio=DIRETORIO_MODELOS):
+    with etapa('modelo') as medicao:
+        artefato = obter_modelo(chave)
+        if artefato is None:
+            with _lock_chave(chave):
+                # Outra thread pode ter treinado enquanto esperávamos o lock
+                artefato = obter_modelo(chave)
+                if artefato is None:
+                    artefato = treinar()
+                    salvar_modelo(chave, artefato, serie=serie, diretorio=diretorio)
+                    medicao['cache'] = 'falta'
+        medicao.setdefault('cache', 'acerto')
+    return artefato
@@ -0,0 +1,329 @@
+import copy
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error
+
+from calendario import compor_se, decompor_se, deslocar_ses, inicio_semanas
+from config import SEMANAS_REVISAO
+
+# Motor de previsão de séries temporais: cada semana é prevista a partir dos
+# casos das semanas anteriores (lags), do clima e do Rt da semana anterior e da
+# sazonalidade. A previsão de várias semanas é recursiva: cada semana prevista
+# vira lag da seguinte. Nada é aleatório, então a mesma série gera sempre a
+# mesma previsão.
+
+LAGS_CASOS = (1, 2, 3, 4, 52)
+VARIAVEIS = [f'casos_{lag}' for lag in LAGS_CASOS] + [
+    'temp_1', 'umid_1', 'rt_1', 'sen_semana', 'cos_semana', 'População',
+]
+EXOGENAS = {'temp_1': 'Temp Média', 'umid_1': 'Umidade Média', 'rt_1': 'Rt'}
+
+# Duração média do ano epidemiológico em semanas (anos de 52 e 53 semanas)
+SEMANAS_POR_ANO = 52.1775
+
+# Semanas finais cujas variáveis mudam quando a API revisa os casos recentes
+# (as semanas revisadas e as que as usam como lag curto)
+SEMANAS_RECENTES = SEMANAS_REVISAO + 4
+
+
+def _sazonalidade(semanas):
+    angulo = 2 * np.pi * np.asarray(semanas, dtype=np.float64) / SEMANAS_POR_ANO
+    return np.sin(angulo), np.cos(angulo)
+
+
+# Série com todas as semanas entre a primeira e a última, em ordem: as semanas
+# que faltam na API entram com valores NaN, para que cada lag (deslocamento de
+# linhas) seja mesmo o da semana anterior correspondente
+def _reindexar(serie):
+    serie = serie.sort_values(['Ano', 'Semana'], ignore_index=True)
+    if serie.empty:
+        return serie
+    se = compor_se(serie['Ano'], serie['Semana'])
+    posicoes = (inicio_semanas(se) - inicio_semanas(se[0])).astype(np.int64) // 7
+    if posicoes[-1] + 1 == len(serie):
+        return serie
+    anos, semanas = decompor_se(deslocar_ses(se[0], np.arange(posicoes[-1] + 1)))
+    completa = pd.DataFrame({'Ano': anos.astype(serie['Ano'].dtype), 'Semana': semanas.astype(serie['Semana'].dtype)})
+    for coluna in serie.columns.drop(['Ano', 'Semana']):
+        valores = np.full(len(completa), np.nan)
+        valores[posicoes] = serie[coluna].to_numpy(dtype=np.float64)
+        completa[coluna] = valores
+    return completa
+
+
+# Função para completar a série: todas as semanas em ordem, com o clima e o Rt
+# que faltam tirados da climatologia (`clima`, calculada da própria série se
+# omitida) e a população da semana mais próxima. Os casos que faltam continuam NaN.
+def completar_serie(serie, clima=None):
+    serie = _reindexar(serie)
+    if clima is None:
+        clima = climatologia(serie)
+    semanas = serie['Semana'].to_numpy()
+    for coluna in EXOGENAS.values():
+        faltantes = serie[coluna].isna().to_numpy()
+        if faltantes.any():
+            serie[coluna] = np.where(faltantes, clima[coluna].reindex(semanas).to_numpy(), serie[coluna])
+    serie['População'] = serie['População'].ffill().bfill()
+    return serie
+
+
+# Função para montar as variáveis de cada semana da série completa (ver completar_serie)
+def montar_variaveis(serie):
+    variaveis = pd.DataFrame({'Ano': serie['Ano'], 'Semana': serie['Semana'], 'Casos': serie['Casos']})
+    for lag in LAGS_CASOS:
+        variaveis[f'casos_{lag}'] = serie['Casos'].shift(lag)
+    for nome, coluna in EXOGENAS.items():
+        variaveis[nome] = serie[coluna].shift(1)
+    variaveis['sen_semana'], variaveis['cos_semana'] = _sazonalidade(serie['Semana'])
+    variaveis['População'] = serie['População']
+    return variaveis
+
+
+# Clima e Rt típicos de cada semana do ano, usados nas semanas futuras
+def climatologia(serie):
+    medias = serie.groupby('Semana')[list(EXOGENAS.values())].mean()
+    medias = medias.reindex(range(1, 54)).ffill().bfill()
+    return medias.fillna(serie[list(EXOGENAS.values())].mean())
+
+
+# Previsão do modelo para as linhas de X (matriz nas colunas de VARIAVEIS).
+# A Random Forest é percorrida árvore a árvore nesta thread, com o mesmo
+# resultado do predict: com uma linha só, a validação da entrada e o despacho
+# das árvores para as threads do n_jobs custam muito mais que as árvores.
+def _prever(modelo, X):
+    if isinstance(modelo, RandomForestRegressor):
+        X = X.astype(np.float32)
+        soma = np.zeros(len(X))
+        for arvore in modelo.estimators_:
+            soma += arvore.predict(X, check_input=False)
+        return soma / len(modelo.estimators_)
+    if isinstance(modelo, LinearRegression):
+        return X @ modelo.coef_ + modelo.intercept_
+    return modelo.predict(pd.DataFrame(X, columns=VARIAVEIS))
+
+
+# Função para prever recursivamente as semanas seguintes ao histórico informado
+def prever_recursivo(modelo, historico, horizonte, clima=None):
+    if clima is None:
+        clima = climatologia(_reindexar(historico))
+    historico = completar_serie(historico, clima)
+
+    anterior = historico.iloc[-1]
+    anos, semanas = decompor_se(deslocar_ses(compor_se(anterior['Ano'], anterior['Semana']),
+                                             np.arange(1, horizonte + 1)))
+    senos, cossenos = _sazonalidade(semanas)
+
+    # Casos observados seguidos dos previstos; semanas sem casos repetem a anterior
+    observados = len(historico)
+    casos = np.concatenate([historico['Casos'].ffill().fillna(0.0).to_numpy(dtype=np.float64),
+                            np.empty(horizonte)])
+    lags = np.array(LAGS_CASOS)
+
+    # Variáveis de todas as semanas previstas; só os lags mudam a cada passo
+    X = np.empty((horizonte, len(VARIAVEIS)))
+    exogenas = slice(len(LAGS_CASOS), len(LAGS_CASOS) + len(EXOGENAS))
+    # Primeira semana: clima e Rt da última semana observada (completados pela
+    # climatologia se faltarem); nas seguintes, da climatologia da semana
+    # anterior, que também foi prevista
+    X[0, exogenas] = historico[list(EXOGENAS.values())].iloc[-1].to_numpy(dtype=np.float64)
+    X[1:, exogenas] = clima.loc[semanas[:-1]].to_numpy()
+    X[:, exogenas.stop:] = np.column_stack([senos, cossenos,
+                                            np.full(horizonte, historico['População'].ffill().iloc[-1])])
+
+    for passo in range(horizonte):
+        X[passo, :len(LAGS_CASOS)] = casos[observados + passo - lags]
+        casos[observados + passo] = max(float(_prever(modelo, X[passo:passo + 1])[0]), 0.0)
+
+    return pd.DataFrame({'Ano': anos.astype(np.int64), 'Semana': semanas.astype(np.int64),
+                         'Casos previstos': casos[observados:]})
+
+
+def _linhas_treino(serie, anos):
+    variaveis = montar_variaveis(serie)
+    return variaveis[variaveis['Ano'].isin(anos)].dropna()
+
+
+# Função para treinar o modelo com as semanas dos anos selecionados, avaliá-lo
+# por validação walk-forward (origens sucessivas, previsões recursivas de
+# `horizonte` semanas, treinando só com o passado de cada origem) e prever as
+# próximas `horizonte_previsao` semanas a partir da última semana observada
+def treinar(serie, anos, criar_modelo, origens=4, horizonte=13, horizonte_previsao=52):
+    grade = _reindexar(serie)
+    clima = climatologia(grade)
+    serie = completar_serie(grade, clima)
+    validas = _linhas_treino(serie, anos)
+    if len(validas) < 2 * max(LAGS_CASOS):
+        raise ValueError("Dados insuficientes para treinar o modelo: são necessárias ao menos duas temporadas.")
+
+    # Origens de validação: as últimas `origens` janelas de `horizonte` semanas
+    # seguidas, terminando na última semana com casos dos anos selecionados e
+    # mantendo ao menos um ano de treinamento antes da primeira. Cada origem
+    # só usa o passado, inclusive na climatologia que completa a série.
+    alvos = grade['Ano'].isin(anos).to_numpy() & grade['Casos'].notna().to_numpy()
+    fim = int(np.flatnonzero(alvos)[-1]) + 1
+    origens = max(1, min(origens, (len(validas) - max(LAGS_CASOS)) // horizonte))
+    avaliadas = 0
+    reais, previstos = [], []
+    for origem in range(fim - origens * horizonte, fim, horizonte):
+        passado = grade.iloc[:origem]
+        clima_origem = climatologia(passado)
+        treino = _linhas_treino(completar_serie(passado, clima_origem), anos)
+        teste = grade.iloc[origem:origem + horizonte][alvos[origem:origem + horizonte]]
+        if len(treino) < max(LAGS_CASOS) or teste.empty:
+            continue
+        modelo = criar_modelo().fit(treino[VARIAVEIS], treino['Casos'])
+
+        # Previsão recursiva a partir da semana anterior à origem, como na
+        # previsão real, comparada com os casos observados de cada semana
+        previsao = prever_recursivo(modelo, passado, horizonte, clima_origem)
+        comparacao = teste[['Ano', 'Semana', 'Casos']].merge(previsao, on=['Ano', 'Semana'])
+        reais.append(comparacao['Casos'].to_numpy(dtype=np.float64))
+        previstos.append(comparacao['Casos previstos'].to_numpy())
+        avaliadas += 1
+    if not avaliadas:
+        raise ValueError("Dados insuficientes para avaliar o modelo: nenhuma janela de validação com casos.")
+
+    reais = np.concatenate(reais)
+    previstos = np.concatenate(previstos)
+
+    modelo = criar_modelo().fit(validas[VARIAVEIS], validas['Casos'])
+    return {
+        'modelo': modelo,
+        'clima': clima,
+        'ultima_se': _ultima_se(serie),
+        'atualizacoes': 0,
+        'linhas_recentes': validas.tail(SEMANAS_RECENTES),
+        'estatisticas': _estatisticas_iniciais(validas) if isinstance(modelo, LinearRegression) else None,
+        'linhas_treino': len(validas),
+        'origens': avaliadas,
+        'horizonte_validacao': horizonte,
+        'r2': r2_score(reais, previstos),
+        'model_accuracy': max(0, min(r2_score(reais, previstos) * 100, 100)),
+        'mse': mean_squared_error(reais, previstos),
+        'mae': mean_absolute_error(reais, previstos),
+        'previsao': prever_recursivo(modelo, serie, horizonte_previsao, clima),
+    }
+
+
+def _ultima_se(serie):
+    ultima = serie.iloc[-1]
+    return int(compor_se(ultima['Ano'], ultima['Semana']))
+
+
+def _se(linhas):
+    return compor_se(linhas['Ano'], linhas['Semana'])
+
+
+# Estatísticas suficientes da regressão linear (X'X e X'y, com intercepto), com
+# as variáveis centradas e escaladas pela média e pelo desvio do treinamento
+# completo. Com as variáveis cruas, a população (da ordem de 1e7 e quase
+# constante) deixa X'X com número de condição perto de 1e34 e o intercepto se perde.
+def _estatisticas(linhas, centro, escala):
+    X = np.column_stack([np.ones(len(linhas)), (linhas[VARIAVEIS].to_numpy(dtype=np.float64) - centro) / escala])
+    y = linhas['Casos'].to_numpy(dtype=np.float64)
+    return X.T @ X, X.T @ y
+
+
+def _estatisticas_iniciais(linhas):
+    valores = linhas[VARIAVEIS].to_numpy(dtype=np.float64)
+    centro = valores.mean(axis=0)
+    escala = valores.std(axis=0)
+    escala[escala == 0] = 1.0
+    xtx, xty = _estatisticas(linhas, centro, escala)
+    return {'xtx': xtx, 'xty': xty, 'centro': centro, 'escala': escala}
+
+
+# Coeficientes e intercepto nas variáveis originais. Variáveis constantes em
+# todas as linhas (colunas nulas depois de centradas) ficam com coeficiente
+# zero, como no LinearRegression.
+def _resolver(estatisticas):
+    xtx, xty = estatisticas['xtx'], estatisticas['xty']
+    ativas = np.diag(xtx) > 0
+    beta = np.zeros(len(xty))
+    beta[ativas] = np.linalg.solve(xtx[np.ix_(ativas, ativas)], xty[ativas])
+    coef = beta[1:] / estatisticas['escala']
+    return beta[0] - coef @ estatisticas['centro'], coef
+
+
+# Função para conferir um modelo linear atualizado contra um treinamento
+# completo com as mesmas semanas: True se as previsões coincidem
+def conferir_atualizacao(artefato, serie, anos):
+    validas = _linhas_treino(completar_serie(serie, artefato['clima']), anos)
+    completo = copy.deepcopy(artefato['modelo']).fit(validas[VARIAVEIS], validas['Casos'])
+    X = validas[VARIAVEIS].to_numpy(dtype=np.float64)
+    return bool(np.allclose(_prever(artefato['modelo'], X), _prever(completo, X)))
+
+
+# Indica se o modelo pode ser atualizado com as semanas novas da série, em vez
+# de treinado de novo: a série precisa continuar a do treinamento, com poucas
+# semanas novas, e o modelo não pode ter acumulado atualizações demais. Na
+# Random Forest, as árvores trocadas (`arvores` por atualização) também não
+# podem chegar a `fracao_arvores` da floresta.
+def pode_atualizar(artefato, serie, max_semanas_novas, max_atualizacoes, arvores=10, fracao_arvores=0.5):
+    if artefato.get('ultima_se') is None or artefato['atualizacoes'] >= max_atualizacoes:
+        return False
+    modelo = artefato['modelo']
+    if (isinstance(modelo, RandomForestRegressor)
+            and (artefato['atualizacoes'] + 1) * arvores >= fracao_arvores * modelo.n_estimators):
+        return False
+    se = _se(serie)
+    novas = int((se > artefato['ultima_se']).sum())
+    return 0 < novas <= max_semanas_novas and bool((se == artefato['ultima_se']).any())
+
+
+# Função para incorporar as semanas novas a um modelo já treinado.
+# Regressão linear: soma as variáveis novas às estatísticas suficientes (e
+# desconta as semanas recentes, que podem ter sido revisadas) e resolve de
+# novo, com o mesmo resultado de um treinamento completo.
+# Random Forest: acrescenta `arvores` árvores treinadas só com as últimas
+# `janela` semanas e descarta as mais antigas, mantendo o tamanho da floresta.
+# As métricas da validação walk-forward são mantidas até o próximo treinamento completo.
+# As semanas sem clima ou Rt são completadas com a climatologia do treinamento
+# completo (guardada no artefato), para que as linhas já somadas não mudem.
+def atualizar(artefato, serie, anos, arvores=10, janela=104, horizonte_previsao=52):
+    serie = completar_serie(serie, artefato['clima'])
+    validas = _linhas_treino(serie, anos)
+
+    recentes = artefato['linhas_recentes']
+    inicio = _se(recentes).min() if len(recentes) else artefato['ultima_se'] + 1
+    novas = validas[_se(validas) >= inicio]
+
+    modelo = copy.deepcopy(artefato['modelo'])
+    estatisticas = None
+    if isinstance(modelo, LinearRegression):
+        anteriores = artefato['estatisticas']
+        centro, escala = anteriores['centro'], anteriores['escala']
+        xtx_antigas, xty_antigas = _estatisticas(recentes, centro, escala)
+        xtx_novas, xty_novas = _estatisticas(novas, centro, escala)
+        estatisticas = dict(anteriores,
+                            xtx=anteriores['xtx'] - xtx_antigas + xtx_novas,
+                            xty=anteriores['xty'] - xty_antigas + xty_novas)
+        modelo.intercept_, modelo.coef_ = _resolver(estatisticas)
+    elif isinstance(modelo, RandomForestRegressor):
+        recente = validas.tail(janela)
+        total = modelo.n_estimators
+        semente = modelo.random_state
+        # Semente diferente a cada atualização: com a mesma, as árvores novas
+        # repetiriam as sementes das anteriores
+        if isinstance(semente, (int, np.integer)):
+            modelo.set_params(random_state=int(semente) + artefato['atualizacoes'] + 1)
+        modelo.set_params(warm_start=True, n_estimators=total + arvores)
+        modelo.fit(recente[VARIAVEIS], recente['Casos'])
+        modelo.estimators_ = modelo.estimators_[arvores:]
+        modelo.set_params(warm_start=False, n_estimators=total, random_state=semente)
+    else:
+        raise ValueError(f"Modelo sem atualização incremental: {type(modelo).__name__}")
+
+    return dict(
+        artefato,
+        modelo=modelo,
+        ultima_se=_ultima_se(serie),
+        atualizacoes=artefato['atualizacoes'] + 1,
+        linhas_recentes=validas.tail(SEMANAS_RECENTES),
+        estatisticas=estatisticas,
+        linhas_treino=artefato['linhas_treino'] - len(recentes) + len(novas),
+        previsao=prever_recursivo(modelo, serie, horizonte_previsao, artefato['clima']),
+    )
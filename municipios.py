@@ -0,0 +1,298 @@
+import json
+import math
+import os
+import threading
+from types import MappingProxyType
+
+import numpy as np
+
+from metricas import etapa, registrar
+
+# Arquivo GeoJSON com todos os municípios (propriedades _id, cod_mun e populacao)
+ARQUIVO_MUNICIPIOS = 'allmun.json'
+
+# Diretório do catálogo pré-processado: tabela de atributos compacta e geometrias
+# em arquivos separados, lidos via memory-map
+DIRETORIO_CATALOGO = 'catalogo_municipios'
+ARQUIVO_ATRIBUTOS = 'atributos.npz'
+ARQUIVOS_GEOMETRIA = ('poligonos', 'aneis', 'pontos', 'coordenadas')
+# Aumente ao mudar o formato do catálogo ou as tolerâncias: o catálogo é refeito
+VERSAO_CATALOGO = 2
+
+# Tolerâncias (em graus) das geometrias simplificadas: o nível 0 é a geometria
+# original e o nível n usa TOLERANCIAS[n - 1]. As coordenadas de cada nível são
+# arredondadas para uma casa decimal abaixo da tolerância.
+TOLERANCIAS = (0.0005, 0.005, 0.02, 0.1)
+# O mapa pode ser aproximado no navegador: o nível é escolhido para um zoom
+# FOLGA_ZOOM acima do inicial, para que a simplificação não apareça logo
+FOLGA_ZOOM = 2
+
+# Catálogo compartilhado por todas as sessões do processo
+_lock = threading.Lock()
+_catalogo = None
+_chave_catalogo = None
+
+
+# Catálogo somente leitura dos municípios, armazenado em colunas.
+# por_id e por_geocode levam à linha do município nas colunas.
+class CatalogoMunicipios:
+    def __init__(self, diretorio=DIRETORIO_CATALOGO):
+        with np.load(os.path.join(diretorio, ARQUIVO_ATRIBUTOS)) as atributos:
+            self.nomes = tuple(atributos['nomes'].tolist())
+            self.geocodes = atributos['geocodes']
+            self.populacao = atributos['populacao']
+            self.centroides = atributos['centroides']
+            self.mtime_origem = int(atributos['mtime_origem'])
+
+        for coluna in (self.geocodes, self.populacao, self.centroides):
+            coluna.flags.writeable = False
+
+        self.por_id = MappingProxyType({nome: linha for linha, nome in enumerate(self.nomes)})
+        self.por_geocode = MappingProxyType({int(geocode): linha for linha, geocode in enumerate(self.geocodes)})
+
+        # Geometrias só são lidas do disco quando um município é desenhado
+        self._diretorio = diretorio
+        self._geometria = {}
+        self._geometrias = {}
+
+    def __len__(self):
+        return len(self.nomes)
+
+    # Geocódigos de todos os municípios, ou só os de uma UF (ex: 'SP')
+    def geocodes_da_uf(self, uf=None):
+        if not uf:
+            return [int(geocode) for geocode in self.geocodes]
+        sufixo = f' - {uf.upper()}'
+        return [int(geocode) for nome, geocode in zip(self.nomes, self.geocodes) if nome.endswith(sufixo)]
+
+    # Atributos de um município (_id ou cod_mun)
+    def atributos(self, municipio):
+        linha = self._linha(municipio)
+        return MappingProxyType({
+            '_id': self.nomes[linha],
+            'cod_mun': int(self.geocodes[linha]),
+            'populacao': int(self.populacao[linha]),
+            'centroide': tuple(self.centroides[linha].tolist()),
+        })
+
+    # Coordenadas do MultiPolygon de um município no nível de simplificação
+    # pedido (0 é a geometria original), montadas sob demanda
+    def geometria(self, municipio, nivel=0):
+        return self._coordenadas(self._linha(municipio), nivel)
+
+    # Coordenadas de todos os municípios, na ordem do catálogo, montadas uma
+    # única vez por nível e compartilhadas (somente leitura)
+    def geometrias(self, nivel):
+        if nivel not in self._geometrias:
+            self._geometrias[nivel] = tuple(self._coordenadas(linha, nivel) for linha in range(len(self)))
+        return self._geometrias[nivel]
+
+    def _coordenadas(self, linha, nivel):
+        poligonos, aneis, pontos, coordenadas = self._arquivos_geometria(nivel)
+        return [
+            [coordenadas[pontos[anel]:pontos[anel + 1]].tolist()
+             for anel in range(aneis[poligono], aneis[poligono + 1])]
+            for poligono in range(poligonos[linha], poligonos[linha + 1])
+        ]
+
+    def _linha(self, municipio):
+        if isinstance(municipio, str):
+            return self.por_id[municipio]
+        return self.por_geocode[int(municipio)]
+
+    def _arquivos_geometria(self, nivel):
+        if nivel not in self._geometria:
+            self._geometria[nivel] = tuple(
+                np.load(os.path.join(self._diretorio, _arquivo_geometria(nome, nivel)), mmap_mode='r')
+                for nome in ARQUIVOS_GEOMETRIA
+            )
+        return self._geometria[nivel]
+
+
+def _arquivo_geometria(nome, nivel):
+    return f'{nome}.npy' if nivel == 0 else f'{nome}_{nivel}.npy'
+
+
+# Função para escolher o nível de simplificação para o zoom do mapa: o mais
+# simplificado cuja tolerância não passa do tamanho de um pixel (em graus)
+def nivel_do_zoom(zoom):
+    grau_por_pixel = 360 / (512 * 2 ** (zoom + FOLGA_ZOOM))
+    nivel = 0
+    for indice, tolerancia in enumerate(TOLERANCIAS, start=1):
+        if tolerancia <= grau_por_pixel:
+            nivel = indice
+    return nivel
+
+
+# Centroide (lon, lat) ponderado pela área dos anéis externos
+def _centroide(aneis_externos):
+    area_total = 0.0
+    soma_x = 0.0
+    soma_y = 0.0
+    for anel in aneis_externos:
+        x, y = anel[:, 0], anel[:, 1]
+        cruzado = x[:-1] * y[1:] - x[1:] * y[:-1]
+        area = cruzado.sum() / 2
+        if area == 0:
+            continue
+        soma_x += ((x[:-1] + x[1:]) * cruzado).sum() / 6
+        soma_y += ((y[:-1] + y[1:]) * cruzado).sum() / 6
+        area_total += area
+    if area_total == 0:
+        todos = np.concatenate(aneis_externos)
+        return todos.mean(axis=0)
+    return np.array([soma_x / area_total, soma_y / area_total])
+
+
+# Colunas das geometrias: offsets dos polígonos de cada município, dos anéis de
+# cada polígono e dos pontos de cada anel, e as coordenadas de todos os pontos
+def _colunas_geometria(multipoligonos):
+    poligonos, aneis, pontos = [0], [0], [0]
+    coordenadas = []
+    for multipoligono in multipoligonos:
+        for poligono in multipoligono:
+            for anel in poligono:
+                coordenadas.append(anel)
+                pontos.append(pontos[-1] + len(anel))
+            aneis.append(len(pontos) - 1)
+        poligonos.append(len(aneis) - 1)
+
+    return {
+        'poligonos': np.asarray(poligonos, dtype=np.int64),
+        'aneis': np.asarray(aneis, dtype=np.int64),
+        'pontos': np.asarray(pontos, dtype=np.int64),
+        'coordenadas': np.concatenate(coordenadas) if coordenadas else np.empty((0, 2)),
+    }
+
+
+# Função para simplificar as geometrias de todos os municípios de uma vez.
+# A simplificação de cobertura mantém as divisas compartilhadas entre vizinhos
+# iguais (sem buracos nem sobreposições); se a malha não for uma cobertura
+# válida, cada município é simplificado sozinho, preservando a topologia.
+# Municípios que sumiriam com a tolerância mantêm a geometria original.
+def _simplificar(multipoligonos, tolerancia):
+    import shapely
+
+    geometrias = np.array([
+        shapely.MultiPolygon([shapely.Polygon(poligono[0], poligono[1:]) for poligono in multipoligono])
+        for multipoligono in multipoligonos
+    ], dtype=object)
+    try:
+        simplificadas = shapely.coverage_simplify(geometrias, tolerancia)
+    except (AttributeError, shapely.errors.GEOSException):
+        simplificadas = shapely.simplify(geometrias, tolerancia, preserve_topology=True)
+
+    casas = math.ceil(-math.log10(tolerancia)) + 1
+    resultado = []
+    for original, simplificada in zip(multipoligonos, simplificadas):
+        partes = [parte for parte in shapely.get_parts(simplificada)
+                  if isinstance(parte, shapely.Polygon) and not parte.is_empty]
+        if not partes:
+            resultado.append(original)
+            continue
+        resultado.append([
+            [np.round(np.asarray(anel.coords)[:, :2], casas) for anel in (parte.exterior, *parte.interiors)]
+            for parte in partes
+        ])
+    return resultado
+
+
+# Cada processo e thread grava o seu temporário: vários processos do painel ou
+# dos scripts podem refazer o catálogo ao mesmo tempo
+def _salvar_atomico(caminho, salvar):
+    temporario = f'{caminho}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporario, 'wb') as file:
+        salvar(file)
+    os.replace(temporario, caminho)
+
+
+# Função para converter o allmun.json no catálogo em colunas
+def preprocessar_catalogo(caminho=ARQUIVO_MUNICIPIOS, diretorio=DIRETORIO_CATALOGO):
+    mtime_origem = os.stat(caminho).st_mtime_ns
+    with etapa('allmun_json', bytes=os.path.getsize(caminho)) as medicao:
+        with open(caminho, 'r') as file:
+            features = json.load(file)['features']
+        medicao['linhas'] = len(features)
+
+    nomes, geocodes, populacao, centroides = [], [], [], []
+    multipoligonos = []
+    for feature in features:
+        propriedades = feature['properties']
+        geometria = feature['geometry']
+        multipoligono = geometria['coordinates']
+        if geometria['type'] == 'Polygon':
+            multipoligono = [multipoligono]
+
+        multipoligono = [[np.asarray(anel, dtype=np.float64)[:, :2] for anel in poligono] for poligono in multipoligono]
+        multipoligonos.append(multipoligono)
+
+        nomes.append(propriedades['_id'])
+        geocodes.append(int(propriedades['cod_mun']))
+        populacao.append(int(propriedades.get('populacao') or 0))
+        centroides.append(_centroide([poligono[0] for poligono in multipoligono]))
+
+    # Geometria original (nível 0) e as simplificadas, uma por tolerância
+    os.makedirs(diretorio, exist_ok=True)
+    niveis = [multipoligonos]
+    for tolerancia in TOLERANCIAS:
+        with etapa('simplificacao', linhas=len(multipoligonos)):
+            niveis.append(_simplificar(multipoligonos, tolerancia))
+    for nivel, geometrias in enumerate(niveis):
+        colunas_geometria = _colunas_geometria(geometrias)
+        for nome in ARQUIVOS_GEOMETRIA:
+            _salvar_atomico(os.path.join(diretorio, _arquivo_geometria(nome, nivel)),
+                            lambda file, nome=nome: np.save(file, colunas_geometria[nome]))
+
+    # Atributos gravados por último: a presença deles marca o catálogo como completo
+    _salvar_atomico(os.path.join(diretorio, ARQUIVO_ATRIBUTOS), lambda file: np.savez(
+        file,
+        nomes=np.asarray(nomes, dtype=str),
+        geocodes=np.asarray(geocodes, dtype=np.int32),
+        populacao=np.asarray(populacao, dtype=np.int32),
+        centroides=np.asarray(centroides, dtype=np.float32).reshape(-1, 2),
+        mtime_origem=np.int64(mtime_origem),
+        versao=np.int64(VERSAO_CATALOGO),
+    ))
+
+
+def _mtime_catalogo(diretorio):
+    try:
+        with np.load(os.path.join(diretorio, ARQUIVO_ATRIBUTOS)) as atributos:
+            # Catálogo de outra versão é tratado como inexistente e refeito
+            if 'versao' not in atributos or int(atributos['versao']) != VERSAO_CATALOGO:
+                return None
+            return int(atributos['mtime_origem'])
+    except FileNotFoundError:
+        return None
+
+
+# Função para obter o catálogo, refazendo o pré-processamento apenas quando o
+# allmun.json muda (mtime). Sem o JSON, usa o catálogo já pré-processado.
+def carregar_catalogo(caminho=ARQUIVO_MUNICIPIOS, diretorio=DIRETORIO_CATALOGO):
+    global _catalogo, _chave_catalogo
+
+    try:
+        mtime_origem = os.stat(caminho).st_mtime_ns
+    except FileNotFoundError:
+        mtime_origem = _mtime_catalogo(diretorio)
+        if mtime_origem is None:
+            raise
+
+    chave = (os.path.abspath(diretorio), mtime_origem)
+    if _chave_catalogo == chave:
+        registrar('catalogo', cache='acerto')
+        return _catalogo
+
+    with _lock, etapa('catalogo', cache='falta'):
+        # Outra thread pode ter recarregado enquanto esperávamos o lock
+        if _chave_catalogo != chave:
+            if _mtime_catalogo(diretorio) != mtime_origem:
+                preprocessar_catalogo(caminho, diretorio)
+            _catalogo = CatalogoMunicipios(diretorio)
+            _chave_catalogo = chave
+        return _catalogo
+
+
+if __name__ == '__main__':
+    preprocessar_catalogo()
+    print(f"Catálogo gravado em {DIRETORIO_CATALOGO}/")
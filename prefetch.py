@@ -0,0 +1,125 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cliente_api import APIIndisponivel, ErroAPI, limitar_taxa
+from config import DIRETORIO_CACHE, ANO_INICIAL_SERIE, PAUSA_DISJUNTOR
+from municipios import carregar_catalogo
+from sincronizacao import sincronizar
+
+# Pré-carga das séries do alertcity para todos os municípios, para que o
+# painel leia apenas dados locais. Uso:
+#   python prefetch.py --doencas dengue zika --ano-inicial 2018 --workers 4
+
+DOENCAS = ('dengue', 'chikungunya', 'zika')
+ARQUIVO_PROGRESSO = os.path.join(DIRETORIO_CACHE, 'prefetch_progresso.log')
+
+
+# Progresso salvo em disco para retomar uma execução interrompida: cada série
+# concluída acrescenta uma linha ao arquivo, sem regravar as anteriores
+class Progresso:
+    def __init__(self, caminho, reiniciar=False):
+        self.caminho = caminho
+        self.concluidos = set()
+        self._lock = threading.Lock()
+        conteudo = ''
+        if not reiniciar and os.path.exists(caminho):
+            with open(caminho, 'r') as file:
+                conteudo = file.read()
+            self.concluidos = set(conteudo.split())
+        self._arquivo = open(caminho, 'w' if reiniciar else 'a')
+        # Última linha cortada por uma interrupção: a próxima começa numa linha nova
+        if conteudo and not conteudo.endswith('\n'):
+            self._arquivo.write('\n')
+
+    def concluido(self, chave):
+        return chave in self.concluidos
+
+    def marcar(self, chave):
+        with self._lock:
+            self.concluidos.add(chave)
+            self._arquivo.write(chave + '\n')
+            self._arquivo.flush()
+
+    def fechar(self):
+        with self._lock:
+            self._arquivo.close()
+
+    def limpar(self):
+        self.fechar()
+        if os.path.exists(self.caminho):
+            os.remove(self.caminho)
+
+
+def _sincronizar(geocode, disease, ano_inicial):
+    while True:
+        try:
+            return sincronizar(geocode, disease, ano_inicial)
+        except APIIndisponivel:
+            # O disjuntor abriu: espera a pausa e tenta o mesmo item de novo
+            time.sleep(PAUSA_DISJUNTOR)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pré-carrega as séries do Info Dengue no armazenamento local.")
+    parser.add_argument('--doencas', nargs='+', choices=DOENCAS, default=list(DOENCAS))
+    parser.add_argument('--ano-inicial', type=int, default=ANO_INICIAL_SERIE)
+    parser.add_argument('--municipios', nargs='+', type=int, metavar='GEOCODE',
+                        help="Geocódigos a carregar (padrão: todos do allmun.json)")
+    parser.add_argument('--uf', help="Carrega apenas os municípios desta UF (ex: SP)")
+    parser.add_argument('--workers', type=int, default=4, help="Requisições simultâneas")
+    parser.add_argument('--requisicoes-por-segundo', type=float, default=2.0)
+    parser.add_argument('--progresso', default=ARQUIVO_PROGRESSO)
+    parser.add_argument('--reiniciar', action='store_true', help="Ignora o progresso salvo")
+    args = parser.parse_args(argv)
+
+    geocodes = args.municipios
+    if not geocodes:
+        geocodes = carregar_catalogo().geocodes_da_uf(args.uf)
+
+    os.makedirs(os.path.dirname(args.progresso) or '.', exist_ok=True)
+    progresso = Progresso(args.progresso, args.reiniciar)
+    tarefas = [(geocode, disease) for geocode in geocodes for disease in args.doencas
+               if not progresso.concluido(f'{geocode}:{disease}:{args.ano_inicial}')]
+    total = len(tarefas)
+    print(f"{total} séries a carregar ({len(geocodes) * len(args.doencas) - total} já concluídas)", file=sys.stderr)
+
+    # O limite vale para cada requisição à API, inclusive as novas tentativas
+    limitar_taxa(args.requisicoes_por_segundo)
+    falhas = 0
+    inicio = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(_sincronizar, geocode, disease, args.ano_inicial): (geocode, disease)
+            for geocode, disease in tarefas
+        }
+        for feitos, future in enumerate(as_completed(futures), start=1):
+            geocode, disease = futures[future]
+            try:
+                semanas = future.result()
+            except ErroAPI as e:
+                falhas += 1
+                status = f"erro: {e}"
+            else:
+                progresso.marcar(f'{geocode}:{disease}:{args.ano_inicial}')
+                status = f"{semanas} semanas"
+            decorrido = time.monotonic() - inicio
+            restante = decorrido / feitos * (total - feitos)
+            print(f"[{feitos}/{total}] {geocode} {disease}: {status} (restante ~{restante:.0f}s)", file=sys.stderr)
+
+    print(f"Concluído: {total - falhas} séries carregadas, {falhas} falhas.", file=sys.stderr)
+    if falhas:
+        progresso.fechar()
+        print(f"Execute novamente para tentar as séries que falharam (progresso em {args.progresso}).", file=sys.stderr)
+        return 1
+
+    # Execução completa: a próxima começa do zero e atualiza todas as séries
+    progresso.limpar()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
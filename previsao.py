@@ -1,60 +1,204 @@
+import os
+from contextlib import contextmanager
+
 import streamlit as st
-import json
-import requests
-import pandas as pd
 import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error
 
-# Configuração da página para layout amplo
-st.set_page_config(layout='wide')
+from baselines import BASELINES, prever_baseline
+from cliente_api import ErroAPI
+from config import (RF_N_JOBS, RF_N_ESTIMATORS, RF_MAX_DEPTH, HORIZONTE_PREVISAO,
+                    MAX_SEMANAS_ATUALIZACAO, MAX_ATUALIZACOES, RF_ARVORES_ATUALIZACAO, RF_FRACAO_ATUALIZADA,
+                    PAINEL_DESEMPENHO)
+from graficos import figura_previsao
+from ingestao import alertcity_para_dataframe
+from metricas import etapa, execucao, exibir_painel
+from modelos import (DIRETORIO_MODELOS, chave_modelo, chave_serie, obter_modelo, obter_ou_treinar, obter_ultimo_modelo,
+                     versao_dados)
+from motor_previsao import atualizar, pode_atualizar, treinar
+from municipios import carregar_catalogo
+from sincronizacao import ler_serie, sincronizar, ultima_se
+from transporte import TIPO_ARROW, coluna_binaria, tabela_arrow
+
+# Modelos disponíveis para a previsão
+MODEL_OPTIONS = ["Random Forest", "Regressão Linear"]
 
-# Função para carregar dados do JSON
+# Função para obter o catálogo de municípios compartilhado pelo processo
 def fetch_municipios_data():
     try:
-        with open('allmun.json', 'r') as file:
-            return json.load(file)
+        return carregar_catalogo()
     except FileNotFoundError:
         st.error("Arquivo 'allmun.json' não encontrado. Certifique-se de que ele está na mesma pasta.")
         return None
 
-# Função para buscar dados da API
+# Função para buscar os dados: atualiza a série local só com as semanas
+# novas e devolve o histórico completo até a semana corrente
 def fetch_epidemiological_data(geocode, disease):
-    url = f"https://info.dengue.mat.br/api/alertcity?geocode={geocode}&disease={disease}&format=json&ew_start=1&ew_end=52&ey_start=2014&ey_end=2024"
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Erro ao buscar dados da API: {response.status_code}")
+        sincronizar(geocode, disease)
+    except ErroAPI as e:
+        if ultima_se(geocode, disease) is None:
+            st.error(f"Erro ao buscar dados da API: {e}")
             return []
-    except Exception as e:
-        st.error(f"Erro ao conectar na API: {e}")
-        return []
-
-# Função para simular dados futuros
-def simulate_future_data(weeks, historical_population):
-    return pd.DataFrame({
-        'Semana': weeks,
-        'Temp Média': np.random.uniform(20, 30, size=len(weeks)),
-        'Umidade Média': np.random.uniform(60, 90, size=len(weeks)),
-        'Rt': np.random.uniform(0.8, 1.2, size=len(weeks)),
-        'População': [historical_population] * len(weeks)
-    })
+        st.warning(f"Não foi possível atualizar os dados da API ({e}). Exibindo os dados já armazenados.")
+    return ler_serie(geocode, disease)
+
+# Função para transformar os registros da API nos dados semanais usados no treinamento
+def prepare_data(historical_data):
+    historical_df = alertcity_para_dataframe(historical_data)
+    years_used = set(historical_df['Ano'].unique().tolist())
+    if historical_df.empty:
+        return historical_df, years_used
+
+    # Agrupar dados por semana
+    with etapa('groupby', linhas=len(historical_df)):
+        historical_weekly_cases = historical_df.groupby(['Ano', 'Semana']).mean().reset_index()
+    return historical_weekly_cases, years_used
+
+# Função para criar o modelo de regressão escolhido
+def create_model(model_option):
+    if model_option == "Random Forest":
+        return RandomForestRegressor(n_estimators=RF_N_ESTIMATORS, max_depth=RF_MAX_DEPTH,
+                                     n_jobs=RF_N_JOBS, random_state=42)
+    elif model_option == "Regressão Linear":
+        # tol=0: mínimos quadrados exatos. Com o padrão (1e-6, o `cond` do
+        # lstsq), a escala da população faz o ajuste descartar direções válidas.
+        return LinearRegression(tol=0.0)
+    raise ValueError(f"Modelo desconhecido: {model_option}")
+
+# Para os pools de processos: os processos iniciados dentro do bloco treinam cada
+# Random Forest em um só núcleo (os processos já ocupam todos), a menos que
+# ARBOVIROSE_RF_N_JOBS tenha sido definido. O ambiente do processo atual é restaurado no fim.
+@contextmanager
+def single_core_workers():
+    definido = 'ARBOVIROSE_RF_N_JOBS' in os.environ
+    if not definido:
+        os.environ['ARBOVIROSE_RF_N_JOBS'] = '1'
+    try:
+        yield
+    finally:
+        if not definido:
+            os.environ.pop('ARBOVIROSE_RF_N_JOBS', None)
+
+# Função para treinar o modelo com as variáveis defasadas (lags), avaliá-lo por
+# validação walk-forward e prever as próximas semanas
+def train_model(historical_weekly_cases, years, model_option):
+    return treinar(historical_weekly_cases, years, lambda: create_model(model_option),
+                   horizonte_previsao=HORIZONTE_PREVISAO)
+
+# Identificação do modelo com os hiperparâmetros que mudam o resultado do treinamento
+def model_signature(model_option):
+    signature = f"{model_option}|horizonte={HORIZONTE_PREVISAO}"
+    if model_option == "Random Forest":
+        signature += f"|n_estimators={RF_N_ESTIMATORS}|max_depth={RF_MAX_DEPTH}"
+    return signature
+
+# Chave do modelo no cache. A versão dos dados considera a série inteira, pois
+# a previsão parte da última semana observada mesmo fora dos anos selecionados.
+def model_key(geocode, disease, historical_weekly_cases, years, model_option):
+    return chave_modelo(geocode, disease, years, model_signature(model_option), versao_dados(historical_weekly_cases))
+
+# Chave que aponta para o modelo mais recente do município, doença, anos e modelo
+def series_key(geocode, disease, years, model_option):
+    return chave_serie(geocode, disease, years, model_signature(model_option))
+
+# Função para obter um modelo para os dados atuais: atualiza o modelo anterior
+# quando só chegaram semanas novas e treina do zero nos demais casos
+def build_model(geocode, disease, historical_weekly_cases, years, model_option):
+    anterior = obter_ultimo_modelo(series_key(geocode, disease, years, model_option))
+    if anterior is not None and pode_atualizar(anterior, historical_weekly_cases,
+                                               MAX_SEMANAS_ATUALIZACAO, MAX_ATUALIZACOES,
+                                               RF_ARVORES_ATUALIZACAO, RF_FRACAO_ATUALIZADA):
+        return atualizar(anterior, historical_weekly_cases, years, arvores=RF_ARVORES_ATUALIZACAO,
+                         horizonte_previsao=HORIZONTE_PREVISAO)
+    return train_model(historical_weekly_cases, years, model_option)
+
+# Função para obter o modelo treinado com os anos selecionados, do cache quando possível
+# (os modelos novos são gravados no cache `diretorio`, por padrão o do painel)
+def fit_cached_model(geocode, disease, historical_weekly_cases, years, model_option, diretorio=DIRETORIO_MODELOS):
+    chave = model_key(geocode, disease, historical_weekly_cases, years, model_option)
+    return obter_ou_treinar(chave, lambda: build_model(geocode, disease, historical_weekly_cases, years, model_option),
+                            serie=series_key(geocode, disease, years, model_option), diretorio=diretorio)
+
+# Indica se o modelo de regressão já está pronto no cache (sem treinar)
+def model_is_ready(geocode, disease, historical_weekly_cases, years, model_option):
+    return obter_modelo(model_key(geocode, disease, historical_weekly_cases, years, model_option)) is not None
+
+# Função para obter a previsão de qualquer modelo disponível (regressão ou referência)
+def forecast_model(geocode, disease, historical_weekly_cases, years, model_option, diretorio=DIRETORIO_MODELOS):
+    if model_option in BASELINES:
+        with etapa('modelo_referencia', linhas=len(historical_weekly_cases)):
+            return prever_baseline(historical_weekly_cases, years, model_option, HORIZONTE_PREVISAO)
+    return fit_cached_model(geocode, disease, historical_weekly_cases, years, model_option, diretorio=diretorio)
+
+# Função para montar o gráfico dos anos selecionados e da previsão
+def forecast_figure(historical_weekly_cases, years_to_display, artefato):
+    # Previsão das próximas semanas, feita (e guardada) no treinamento
+    forecast = artefato['previsao']
+
+    # Criar gráfico interativo a partir do layout pronto (eixos, marcas e
+    # template), com a semana 53 quando algum ano exibido ou previsto a tiver
+    displayed = historical_weekly_cases[historical_weekly_cases['Ano'].isin(years_to_display)]
+    weeks = 53 if (displayed['Semana'] == 53).any() or (forecast['Semana'] == 53).any() else 52
+    fig = figura_previsao(weeks)
+
+    # Adicionando dados históricos por ano selecionado (colunas com tipo
+    # compacto, enviadas em binário ao navegador)
+    for year in years_to_display:
+        year_data = historical_weekly_cases[historical_weekly_cases['Ano'] == year]
+        fig.add_trace(go.Scatter(
+            x=coluna_binaria(year_data['Semana'], np.int16),
+            y=coluna_binaria(year_data['Casos'], np.float32),
+            mode='lines+markers',
+            name=f"Ano {year}",
+            line=dict(dash='dash'),
+        ))
+
+    # Adicionando dados de previsão, uma linha por ano
+    for year, year_forecast in forecast.groupby('Ano'):
+        fig.add_trace(go.Scatter(
+            x=coluna_binaria(year_forecast['Semana'], np.int16),
+            y=coluna_binaria(year_forecast['Casos previstos'], np.float32),
+            mode='lines+markers',
+            name=f'Previsão {year}',
+            line=dict(color='red', width=2),
+        ))
+
+    # Modelos de referência são avaliados no último ano selecionado
+    if artefato['modelo'] is None:
+        validation = f"Validação: último ano selecionado ({artefato['horizonte_validacao']} semanas)"
+    else:
+        validation = (f"Validação walk-forward: {artefato['origens']} origens de "
+                      f"{artefato['horizonte_validacao']} semanas")
+
+    # Título com as métricas (o restante do layout já vem pronto)
+    fig.update_layout(title=dict(
+        text=(f"Linha Temporal - Dados de Treinamento vs Previsão<br>"
+              f"{validation} | "
+              f"Precisão (R²): {artefato['model_accuracy']:.2f}%<br>"
+              f"Erro Médio Absoluto (MAE): {artefato['mae']:.2f} | Erro Quadrático Médio (MSE): {artefato['mse']:.2f}"),
+    ))
+
+    return fig
+
+# Tabela longa com os casos observados e os previstos, uma linha por semana
+def forecast_table(historical_weekly_cases, artefato):
+    observed = historical_weekly_cases[['Ano', 'Semana', 'Casos']].assign(Tipo='observado')
+    forecast = artefato['previsao'].rename(columns={'Casos previstos': 'Casos'}).assign(Tipo='previsto')
+    return pd.concat([observed, forecast], ignore_index=True)
 
 # Função principal
 def display_forecast():
     # Carregar dados dos municípios
-    municipios_data = fetch_municipios_data()
-    if not municipios_data:
+    catalogo = fetch_municipios_data()
+    if not catalogo:
         return
 
     # Extraindo nomes e dados dos municípios
-    municipios = {feature['properties']['_id']: feature for feature in municipios_data['features']}
-    municipio_names = list(municipios.keys())
+    municipio_names = list(catalogo.nomes)
 
     # Configuração da barra lateral
     st.sidebar.title("Configurações para previsão")
@@ -62,13 +206,12 @@ def display_forecast():
     selected_disease = st.sidebar.selectbox("Arbovirose:", ["Dengue", "Zika", "Chikungunya"])
     
     # Obter informações do município selecionado
-    municipio_info = municipios.get(selected_municipio)
-    if not municipio_info:
+    if selected_municipio not in catalogo.por_id:
         st.error("Erro ao obter informações do município selecionado.")
         return
 
-    geocode = municipio_info['properties'].get('cod_mun')
-    population = municipio_info['properties'].get('populacao', 0)
+    municipio_info = catalogo.atributos(selected_municipio)
+    geocode = municipio_info['cod_mun']
 
     # Buscar dados epidemiológicos
     historical_data = fetch_epidemiological_data(geocode, selected_disease)
@@ -77,29 +220,11 @@ def display_forecast():
         return
 
     # Processar os dados históricos
-    all_weeks_data = []
-    years_used = set()
-    for week_data in historical_data:
-        year = int(str(week_data['SE'])[:4])  # Extraindo o ano do formato SE
-        years_used.add(year)
-        all_weeks_data.append({
-            'Semana': int(str(week_data['SE'])[-2:]),
-            'Casos': week_data['casos'],
-            'Ano': year,
-            'Temp Média': week_data['tempmed'],
-            'Umidade Média': week_data['umidmed'],
-            'Rt': week_data['Rt'],
-            'População': week_data['pop']
-        })
-
-    historical_df = pd.DataFrame(all_weeks_data)
-    if historical_df.empty:
+    historical_weekly_cases, years_used = prepare_data(historical_data)
+    if historical_weekly_cases.empty:
         st.warning("Os dados retornados estão vazios.")
         return
 
-    # Agrupar dados por semana
-    historical_weekly_cases = historical_df.groupby(['Ano', 'Semana']).mean().reset_index()
-
     # Ligar/desligar anos de treinamento
     st.sidebar.subheader("Selecione o ano")
     years_to_display = []
@@ -107,90 +232,44 @@ def display_forecast():
         if st.sidebar.checkbox(str(year), value=True):
             years_to_display.append(year)
 
-    # Filtrar os dados históricos pelos anos selecionados
-    filtered_data = historical_weekly_cases[historical_weekly_cases['Ano'].isin(years_to_display)]
+    # Configuração do modelo
+    model_option = st.sidebar.selectbox("Modelo de Regressão:", MODEL_OPTIONS + list(BASELINES))
 
-    # Treinamento do modelo
+    # Modelos de referência são calculados na hora. Os de regressão vêm do cache
+    # (ou do treinamento em lote); se ainda não existirem, a previsão da média
+    # semanal é exibida enquanto o modelo é treinado.
+    chart = st.empty()
     try:
-        X = filtered_data[['Semana', 'Temp Média', 'Umidade Média', 'Rt', 'População']]
-        y = filtered_data['Casos']
-
-        # Remover valores nulos (se houver)
-        X = X.dropna()
-        y = y[X.index]
-
-        # Dividir dados em treino e teste
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-        # Porcentagem de dados usados no treinamento
-        train_percentage = (len(X_train) / len(X)) * 100 if len(X) > 0 else 0
-
-        # Configuração do modelo
-        model_option = st.sidebar.selectbox("Modelo de Regressão:", ["Random Forest", "Regressão Linear"])
-        if model_option == "Random Forest":
-            model = RandomForestRegressor(n_estimators=100, random_state=42)
-        elif model_option == "Regressão Linear":
-            model = LinearRegression()
-
-        # Treinar modelo
-        model.fit(X_train, y_train)
-
-        # Previsões no conjunto de teste
-        y_pred = model.predict(X_test)
-
-        # Cálculo das métricas de erro
-        model_accuracy = max(0, min(r2_score(y_test, y_pred) * 100, 100)) if len(y_test) > 0 else 0
-        mse = mean_squared_error(y_test, y_pred) if len(y_test) > 0 else 0
-        mae = mean_absolute_error(y_test, y_pred) if len(y_test) > 0 else 0
+        if model_option not in BASELINES and not model_is_ready(geocode, selected_disease, historical_weekly_cases,
+                                                                years_to_display, model_option):
+            preview = forecast_model(geocode, selected_disease, historical_weekly_cases, years_to_display, "Média semanal")
+            with chart.container():
+                st.info(f"Treinando o modelo {model_option}. Enquanto isso, é exibida a previsão pela média semanal.")
+                with etapa('grafico'):
+                    st.plotly_chart(forecast_figure(historical_weekly_cases, years_to_display, preview))
 
+        artefato = forecast_model(geocode, selected_disease, historical_weekly_cases, years_to_display, model_option)
     except Exception as e:
+        chart.empty()
         st.error(f"Erro no treinamento do modelo: {e}")
         return
 
-    # Simular dados futuros
-    future_data = simulate_future_data(np.arange(1, 53), population)
-    predicted_cases = model.predict(future_data)
-    predicted_cases = np.maximum(predicted_cases, 0)
-
-    # Criar gráfico interativo
-    fig = go.Figure()
-
-    # Adicionando dados históricos por ano selecionado
-    for year in years_to_display:
-        year_data = historical_weekly_cases[historical_weekly_cases['Ano'] == year]
-        fig.add_trace(go.Scatter(
-            x=year_data['Semana'],
-            y=year_data['Casos'],
-            mode='lines+markers',
-            name=f"Ano {year}",
-            line=dict(dash='dash'),
-        ))
+    # Montagem e serialização do gráfico
+    with etapa('grafico'):
+        chart.plotly_chart(forecast_figure(historical_weekly_cases, years_to_display, artefato))
 
-    # Adicionando dados de previsão
-    fig.add_trace(go.Scatter(
-        x=future_data['Semana'],
-        y=predicted_cases,
-        mode='lines+markers',
-        name='Previsão 2025',
-        line=dict(color='red', width=2),
-    ))
+    # Exportação do histórico e da previsão em Arrow, gerada só quando o botão é clicado
+    st.download_button("Baixar histórico e previsão (Arrow)",
+                       data=lambda: tabela_arrow(forecast_table(historical_weekly_cases, artefato)),
+                       file_name=f"previsao_{geocode}_{selected_disease.lower()}.arrow", mime=TIPO_ARROW,
+                       on_click="ignore")
 
-    # Configurações do layout sem "Anos utilizados"
-    fig.update_layout(
-        title=(f"Linha Temporal - Dados de Treinamento vs Previsão<br>"
-               f"Treinamento: {train_percentage:.1f}% dos dados | Precisão (R²): {model_accuracy:.2f}%<br>"
-               f"Erro Médio Absoluto (MAE): {mae:.2f} | Erro Quadrático Médio (MSE): {mse:.2f}"),
-        xaxis_title="Semana Epidemiológica",
-        yaxis_title="Número de Casos",
-        legend_title="Anos",
-        template="plotly_white",
-        height=600,
-    )
-
-    # Certifique-se de que o eixo X tenha marcas de 1 a 52
-    fig.update_xaxes(tickvals=np.arange(1, 53), ticktext=[str(i) for i in range(1, 53)])
-
-    st.plotly_chart(fig)
-
-# Chama a função principal
-display_forecast()
+# Executado diretamente (streamlit run previsao.py), exibe apenas a previsão.
+# Importado pelo main.py, não executa nada.
+if __name__ == '__main__':
+    # Configuração da página para layout amplo
+    st.set_page_config(layout='wide')
+    with execucao("Previsão de casos") as coletor:
+        display_forecast()
+    if PAINEL_DESEMPENHO:
+        exibir_painel(coletor)
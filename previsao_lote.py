@@ -0,0 +1,117 @@
+import argparse
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from cliente_api import ErroAPI
+from modelos import DIRETORIO_PREVISOES_LOTE
+from municipios import carregar_catalogo
+from baselines import BASELINES
+from previsao import MODEL_OPTIONS, forecast_model, prepare_data, single_core_workers
+from sincronizacao import ler_serie, sincronizar
+from transporte import gravar_arrow
+
+# Previsão em lote para vários municípios (estados, regiões), com um modelo por
+# município treinado em paralelo. Uso:
+#   python previsao_lote.py --uf SP --doenca dengue --saida previsoes_sp.csv
+
+COLUNAS_RESULTADO = ['geocode', 'municipio', 'disease', 'modelo', 'Ano', 'Semana', 'Casos previstos', 'r2', 'mae']
+
+
+# Função executada em cada processo: prevê os casos de um município
+def prever_municipio(geocode, municipio, disease, model_option, anos=None, atualizar=False):
+    if atualizar:
+        sincronizar(geocode, disease)
+
+    historical_weekly_cases, years_used = prepare_data(ler_serie(geocode, disease))
+    if historical_weekly_cases.empty:
+        return pd.DataFrame(columns=COLUNAS_RESULTADO)
+
+    years = sorted(years_used & set(anos)) if anos else sorted(years_used)
+    # Os modelos ficam num cache próprio, com limite de disco: gravá-los no
+    # cache do painel tiraria de lá os modelos usados pelos usuários
+    artefato = forecast_model(geocode, disease, historical_weekly_cases, years, model_option,
+                              diretorio=DIRETORIO_PREVISOES_LOTE)
+    forecast = artefato['previsao']
+    return pd.DataFrame({
+        'geocode': int(geocode),
+        'municipio': municipio,
+        'disease': disease,
+        'modelo': model_option,
+        'Ano': forecast['Ano'],
+        'Semana': forecast['Semana'],
+        'Casos previstos': forecast['Casos previstos'],
+        'r2': artefato['r2'],
+        'mae': artefato['mae'],
+    })
+
+
+# Função para prever vários municípios de uma vez; retorna uma tabela longa
+# (uma linha por município e semana) e a lista de municípios que falharam
+def prever_municipios(geocodes, disease, model_option=MODEL_OPTIONS[0], anos=None,
+                      processos=None, atualizar=False):
+    catalogo = carregar_catalogo()
+    resultados = []
+    falhas = []
+
+    # spawn: os processos leem a configuração (inclusive ARBOVIROSE_RF_N_JOBS) ao iniciar
+    contexto = multiprocessing.get_context('spawn')
+    with single_core_workers(), ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as executor:
+        futures = {}
+        for geocode in geocodes:
+            if int(geocode) not in catalogo.por_geocode:
+                falhas.append((geocode, "município não encontrado no allmun.json"))
+                continue
+            atributos = catalogo.atributos(geocode)
+            future = executor.submit(prever_municipio, geocode, atributos['_id'],
+                                     disease, model_option, anos, atualizar)
+            futures[future] = geocode
+
+        for future in as_completed(futures):
+            try:
+                resultados.append(future.result())
+            except (ErroAPI, ValueError) as e:
+                falhas.append((futures[future], str(e)))
+
+    if not resultados:
+        return pd.DataFrame(columns=COLUNAS_RESULTADO), falhas
+    tabela = pd.concat(resultados, ignore_index=True)
+    return tabela.sort_values(['geocode', 'Ano', 'Semana'], ignore_index=True), falhas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prevê os casos de vários municípios de uma vez.")
+    parser.add_argument('--doenca', choices=['dengue', 'chikungunya', 'zika'], default='dengue')
+    parser.add_argument('--modelo', choices=MODEL_OPTIONS + list(BASELINES), default=MODEL_OPTIONS[0])
+    parser.add_argument('--municipios', nargs='+', type=int, metavar='GEOCODE')
+    parser.add_argument('--uf', help="Prevê todos os municípios desta UF (ex: SP)")
+    parser.add_argument('--anos', nargs='+', type=int, help="Anos de treinamento (padrão: todos)")
+    parser.add_argument('--processos', type=int, default=os.cpu_count())
+    parser.add_argument('--atualizar', action='store_true',
+                        help="Sincroniza as séries com a API antes de prever (padrão: usa só os dados locais)")
+    parser.add_argument('--saida', default='previsoes.csv', help="Arquivo .csv, .parquet ou .arrow")
+    args = parser.parse_args(argv)
+
+    geocodes = args.municipios or carregar_catalogo().geocodes_da_uf(args.uf)
+    tabela, falhas = prever_municipios(geocodes, args.doenca, args.modelo, args.anos,
+                                       args.processos, args.atualizar)
+
+    if args.saida.endswith('.parquet'):
+        tabela.to_parquet(args.saida, index=False)
+    elif args.saida.endswith('.arrow'):
+        gravar_arrow(tabela, args.saida)
+    else:
+        tabela.to_csv(args.saida, index=False)
+
+    for geocode, erro in falhas:
+        print(f"{geocode}: erro: {erro}", file=sys.stderr)
+    print(f"{tabela['geocode'].nunique()} municípios previstos, {len(falhas)} falhas. Resultado em {args.saida}",
+          file=sys.stderr)
+    return 1 if falhas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+# Substituto local da API alertcity do Info Dengue, para rodar o painel sem
+# rede e fazer testes de carga sem sobrecarregar o serviço público.
+#   gravar:     proxy para a API real que salva as respostas em disco
+#   reproduzir: responde com as séries gravadas, com latência e erros configuráveis
+# Para apontar a aplicação para o simulador:
+#   ARBOVIROSE_URL_API=http://localhost:8765/api/alertcity streamlit run main.py
+
+# As séries gravadas ficam no mesmo formato das fixtures do benchmark.py:
+# um arquivo {geocode}_{doença}.json com a lista de registros da série
+DIRETORIO_FIXTURES = os.path.join('fixtures', 'alertcity')
+URL_ORIGEM = 'https://info.dengue.mat.br/api/alertcity'
+PORTA = 8765
+
+
+def _caminho(diretorio, geocode, disease):
+    return os.path.join(diretorio, f'{int(geocode)}_{disease.lower()}.json')
+
+
+# Intervalo de semanas pedido, como os números SE (AAAASS) dos registros
+def _intervalo(params):
+    inicio = int(params['ey_start']) * 100 + int(params['ew_start'])
+    fim = int(params['ey_end']) * 100 + int(params['ew_end'])
+    return inicio, fim
+
+
+# Séries gravadas, lidas do disco uma vez e mantidas em memória
+class Gravacoes:
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def ler(self, geocode, disease):
+        chave = (int(geocode), disease.lower())
+        with self._lock:
+            if chave not in self._series:
+                caminho = _caminho(self.diretorio, geocode, disease)
+                if not os.path.exists(caminho):
+                    return None
+                with open(caminho, 'r') as file:
+                    registros = json.load(file)
+                # Como a API, do mais recente para o mais antigo
+                self._series[chave] = sorted(registros, key=lambda registro: registro['SE'], reverse=True)
+            return self._series[chave]
+
+    # Junta os registros novos aos já gravados da série (os novos prevalecem)
+    def gravar(self, geocode, disease, registros):
+        with self._lock:
+            caminho = _caminho(self.diretorio, geocode, disease)
+            por_se = {}
+            if os.path.exists(caminho):
+                with open(caminho, 'r') as file:
+                    por_se = {registro['SE']: registro for registro in json.load(file)}
+            por_se.update({registro['SE']: registro for registro in registros})
+
+            os.makedirs(self.diretorio, exist_ok=True)
+            temporario = caminho + '.tmp'
+            with open(temporario, 'w') as file:
+                json.dump([por_se[se] for se in sorted(por_se)], file)
+            os.replace(temporario, caminho)
+            self._series.pop((int(geocode), disease.lower()), None)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'SimuladorAlertcity/1.0'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if not url.path.rstrip('/').endswith('alertcity'):
+            return self._responder(404, {'erro': 'rota desconhecida'})
+        params = {nome: valores[0] for nome, valores in parse_qs(url.query).items()}
+        try:
+            int(params['geocode'])
+            _intervalo(params)
+            params['disease']
+        except (KeyError, ValueError):
+            return self._responder(400, {'erro': 'parâmetros inválidos'})
+
+        if self.server.modo == 'gravar':
+            self._gravar(url.query, params)
+        else:
+            self._reproduzir(params)
+
+    def _gravar(self, query, params):
+        try:
+            response = self.server.sessao.get(f'{self.server.origem}?{query}', timeout=(3.05, 60))
+        except requests.RequestException as e:
+            return self._responder(502, {'erro': f'falha ao acessar a API: {e.__class__.__name__}'})
+        if response.status_code == 200:
+            self.server.gravacoes.gravar(params['geocode'], params['disease'], response.json())
+        self._responder(response.status_code, response.content)
+
+    def _reproduzir(self, params):
+        servidor = self.server
+        if servidor.latencia or servidor.variacao:
+            time.sleep(max(0.0, servidor.latencia + random.uniform(-servidor.variacao, servidor.variacao)) / 1000)
+
+        # Injeção de falhas: conexão derrubada sem resposta ou status de erro
+        sorteio = random.random()
+        if sorteio < servidor.taxa_quedas:
+            self.close_connection = True
+            self.connection.close()
+            return
+        if sorteio < servidor.taxa_quedas + servidor.taxa_erros:
+            return self._responder(servidor.status_erro, {'erro': 'falha simulada'})
+
+        registros = servidor.gravacoes.ler(params['geocode'], params['disease'])
+        if registros is None:
+            return self._responder(404, {'erro': 'série não gravada'})
+        inicio, fim = _intervalo(params)
+        self._responder(200, [registro for registro in registros if inicio <= registro['SE'] <= fim])
+
+    def _responder(self, status, corpo):
+        if not isinstance(corpo, bytes):
+            corpo = json.dumps(corpo).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        if not self.server.silencioso:
+            super().log_message(format, *args)
+
+
+# Função para criar o servidor (sem iniciá-lo); latência e variação em milissegundos
+def criar_servidor(modo='reproduzir', diretorio=DIRETORIO_FIXTURES, host='127.0.0.1', porta=PORTA,
+                   origem=URL_ORIGEM, latencia=0.0, variacao=0.0, taxa_erros=0.0, status_erro=503,
+                   taxa_quedas=0.0, silencioso=False):
+    servidor = ThreadingHTTPServer((host, porta), _Handler)
+    servidor.daemon_threads = True
+    servidor.modo = modo
+    servidor.gravacoes = Gravacoes(diretorio)
+    servidor.origem = origem
+    servidor.sessao = requests.Session()
+    servidor.latencia = latencia
+    servidor.variacao = variacao
+    servidor.taxa_erros = taxa_erros
+    servidor.status_erro = status_erro
+    servidor.taxa_quedas = taxa_quedas
+    servidor.silencioso = silencioso
+    return servidor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulador local da API alertcity do Info Dengue.")
+    parser.add_argument('modo', choices=['gravar', 'reproduzir'])
+    parser.add_argument('--fixtures', default=DIRETORIO_FIXTURES, help="Diretório das séries gravadas")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=PORTA)
+    parser.add_argument('--origem', default=URL_ORIGEM, help="URL da API real (modo gravar)")
+    parser.add_argument('--latencia', type=float, default=0.0, help="Latência média, em ms (modo reproduzir)")
+    parser.add_argument('--variacao', type=float, default=0.0, help="Variação máxima da latência, em ms")
+    parser.add_argument('--taxa-erros', type=float, default=0.0, help="Fração das requisições respondidas com erro")
+    parser.add_argument('--status-erro', type=int, default=503)
+    parser.add_argument('--taxa-quedas', type=float, default=0.0,
+                        help="Fração das requisições com a conexão derrubada sem resposta")
+    parser.add_argument('--silencioso', action='store_true', help="Não registra cada requisição")
+    args = parser.parse_args(argv)
+
+    servidor = criar_servidor(args.modo, args.fixtures, args.host, args.porta, args.origem, args.latencia,
+                              args.variacao, args.taxa_erros, args.status_erro, args.taxa_quedas, args.silencioso)
+    print(f"Simulador ({args.modo}) em http://{args.host}:{args.porta}/api/alertcity", file=sys.stderr)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import json
+import os
+import time
+
+from cache_api import conectar
+from calendario import deslocar_se, se_atual
+from cliente_api import requisitar_alertcity
+from config import DIRETORIO_CACHE, TTL_ANO_CORRENTE, ANO_INICIAL_SERIE, SEMANAS_REVISAO
+from metricas import etapa, registrar
+
+# Séries históricas semana a semana, atualizadas de forma incremental
+ARQUIVO_SERIES = os.path.join(DIRETORIO_CACHE, 'series.sqlite')
+
+ESQUEMA_SERIES = """
+    CREATE TABLE IF NOT EXISTS semana (
+        geocode INTEGER NOT NULL,
+        disease TEXT NOT NULL,
+        SE INTEGER NOT NULL,
+        registro TEXT NOT NULL,
+        PRIMARY KEY (geocode, disease, SE)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS semana_por_se ON semana (disease, SE);
+    CREATE TABLE IF NOT EXISTS sincronia (
+        geocode INTEGER NOT NULL,
+        disease TEXT NOT NULL,
+        primeira_se INTEGER NOT NULL,
+        ultima_se INTEGER,
+        sincronizado_em REAL NOT NULL,
+        PRIMARY KEY (geocode, disease)
+    );
+"""
+
+
+def _conexao():
+    return conectar(ARQUIVO_SERIES, ESQUEMA_SERIES)
+
+
+def _estado(geocode, disease):
+    return _conexao().execute(
+        'SELECT primeira_se, ultima_se, sincronizado_em FROM sincronia WHERE geocode=? AND disease=?',
+        (int(geocode), disease.lower())).fetchone()
+
+
+# Última semana epidemiológica (SE) armazenada localmente, ou None
+def ultima_se(geocode, disease):
+    estado = _estado(geocode, disease)
+    return estado[1] if estado else None
+
+
+# Função para trazer da API apenas as semanas que faltam na série local.
+# As últimas SEMANAS_REVISAO semanas são buscadas de novo porque a API
+# revisa os casos recentes. Retorna o número de semanas recebidas.
+def sincronizar(geocode, disease, ano_inicial=ANO_INICIAL_SERIE, forcar=False):
+    geocode, disease = int(geocode), disease.lower()
+    primeira_se = ano_inicial * 100 + 1
+    atual = se_atual()
+
+    estado = _estado(geocode, disease)
+    inicio = primeira_se
+    if estado and estado[0] <= primeira_se:
+        if not forcar and time.time() - estado[2] < TTL_ANO_CORRENTE:
+            registrar('sincronizacao', cache='acerto')
+            return 0
+        if estado[1] is not None:
+            inicio = max(primeira_se, deslocar_se(estado[1], -SEMANAS_REVISAO))
+
+    with etapa('sincronizacao', cache='falta') as medicao:
+        registros = requisitar_alertcity(geocode, disease, inicio % 100, atual % 100, inicio // 100, atual // 100)
+        medicao['linhas'] = len(registros)
+
+    ultima = max((int(registro['SE']) for registro in registros), default=None)
+    if estado and estado[1] is not None:
+        ultima = max(ultima or 0, estado[1])
+    if estado:
+        primeira_se = min(primeira_se, estado[0])
+
+    conexao = _conexao()
+    with conexao:
+        conexao.executemany(
+            'INSERT OR REPLACE INTO semana VALUES (?, ?, ?, ?)',
+            [(geocode, disease, int(registro['SE']), json.dumps(registro)) for registro in registros])
+        conexao.execute('INSERT OR REPLACE INTO sincronia VALUES (?, ?, ?, ?, ?)',
+                        (geocode, disease, primeira_se, ultima, time.time()))
+    return len(registros)
+
+
+# Função para ler a série local, opcionalmente limitada a um intervalo de anos
+def ler_serie(geocode, disease, ano_inicial=None, ano_final=None):
+    inicio = ano_inicial * 100 if ano_inicial else 0
+    fim = ano_final * 100 + 99 if ano_final else 999999
+    with etapa('leitura_serie') as medicao:
+        linhas = _conexao().execute(
+            'SELECT registro FROM semana WHERE geocode=? AND disease=? AND SE BETWEEN ? AND ? ORDER BY SE',
+            (int(geocode), disease.lower(), inicio, fim))
+        registros = [json.loads(registro) for (registro,) in linhas]
+        medicao['linhas'] = len(registros)
+    return registros
+
+
+# Função para ler um ano da série local, se ela já cobrir esse ano.
+# O ano corrente só é lido localmente enquanto a sincronização estiver válida.
+def serie_local(geocode, disease, ano):
+    estado = _estado(geocode, disease)
+    if not estado or estado[0] > ano * 100 + 1:
+        registrar('serie_local', cache='falta')
+        return None
+    if estado[1] is None or estado[1] // 100 <= ano:
+        if time.time() - estado[2] >= TTL_ANO_CORRENTE:
+            registrar('serie_local', cache='falta')
+            return None
+    registrar('serie_local', cache='acerto')
+    return ler_serie(geocode, disease, ano, ano)
+
+
+# Função para somar os casos de todos os municípios com dados locais num ano
+# (ou numa semana do ano) com uma única consulta. Retorna pares (geocode, casos).
+def casos_por_municipio(disease, ano, semana=None):
+    inicio, fim = (ano * 100 + semana,) * 2 if semana else (ano * 100, ano * 100 + 99)
+    with etapa('casos_municipios') as medicao:
+        linhas = _conexao().execute(
+            "SELECT geocode, SUM(json_extract(registro, '$.casos')) FROM semana "
+            "WHERE disease=? AND SE BETWEEN ? AND ? GROUP BY geocode",
+            (disease.lower(), inicio, fim)).fetchall()
+        medicao['linhas'] = len(linhas)
+    return linhas
@@ -0,0 +1,56 @@
+import json
+from functools import lru_cache
+
+import numpy as np
+
+# Envio dos dados ao navegador e exportação em formato binário.
+# Plotly: colunas NumPy de tipo compacto viram typed arrays em base64 (bdata)
+# em vez de listas de números em texto.
+# pydeck: o st.pydeck_chart só aceita JSON, então o deck é serializado sem a
+# indentação que o pydeck usa por padrão (cada coordenada numa linha).
+# Exportação: tabelas em Arrow IPC, lidas sem conversão pelo pandas, polars,
+# DuckDB e pelo Arrow JS.
+# O pydeck e o pyarrow só são importados quando usados: a página de previsão
+# não desenha mapas e só gera Arrow quando a exportação é baixada.
+
+TIPO_ARROW = 'application/vnd.apache.arrow.file'
+
+
+# Coluna como array NumPy contíguo do tipo informado, enviada em binário pelo Plotly
+def coluna_binaria(valores, dtype):
+    return np.ascontiguousarray(np.asarray(valores), dtype=dtype)
+
+
+# Classe do deck serializado em JSON compacto, criada no primeiro mapa do processo
+@lru_cache(maxsize=None)
+def _classe_deck_compacto():
+    import pydeck as pdk
+    from pydeck.bindings.json_tools import default_serialize
+
+    class DeckCompacto(pdk.Deck):
+        def to_json(self):
+            return json.dumps(self, sort_keys=True, default=default_serialize, separators=(',', ':'))
+
+    return DeckCompacto
+
+
+# Deck do pydeck (mesmos parâmetros do pdk.Deck) serializado em JSON compacto
+def deck_compacto(**parametros):
+    return _classe_deck_compacto()(**parametros)
+
+
+# Função para converter um DataFrame em um arquivo Arrow IPC (bytes) comprimido com zstd
+def tabela_arrow(df):
+    import pyarrow as pa
+
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    destino = pa.BufferOutputStream()
+    with pa.ipc.new_file(destino, tabela.schema, options=pa.ipc.IpcWriteOptions(compression='zstd')) as arquivo:
+        arquivo.write_table(tabela)
+    return destino.getvalue().to_pybytes()
+
+
+# Função para gravar um DataFrame em arquivo Arrow IPC
+def gravar_arrow(df, caminho):
+    with open(caminho, 'wb') as file:
+        file.write(tabela_arrow(df))
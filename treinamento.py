@@ -0,0 +1,184 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+from cliente_api import ErroAPI
+from modelos import (DIRETORIO_LOTE, data_modelo_lote, modelo_lote_existe, obter_modelo, remover_modelo_lote,
+                     salvar_modelo)
+from municipios import carregar_catalogo
+from motor_previsao import conferir_atualizacao
+from previsao import MODEL_OPTIONS, build_model, model_key, prepare_data, series_key, single_core_workers
+from sincronizacao import ler_serie, sincronizar
+
+# Treinamento em lote: ajusta os modelos de previsão de todos os municípios,
+# com todos os anos disponíveis (a seleção padrão do painel), e grava os
+# artefatos e um índice com as métricas. Quando só chegaram semanas novas, os
+# modelos anteriores são atualizados em vez de treinados do zero. Uso:
+#   python treinamento.py --doencas dengue --processos 8
+
+DOENCAS = ('dengue', 'chikungunya', 'zika')
+ARQUIVO_INDICE = os.path.join(DIRETORIO_LOTE, 'indice_metricas.csv')
+COLUNAS_CHAVE = ['geocode', 'disease', 'modelo']
+
+
+# Linha do índice de métricas de um modelo treinado
+def _linha_indice(geocode, disease, model_option, anos, chave, artefato, treinado_em):
+    return {
+        'geocode': int(geocode),
+        'disease': disease,
+        'modelo': model_option,
+        'anos': anos,
+        'chave': chave,
+        'linhas_treino': artefato['linhas_treino'],
+        'origens': artefato['origens'],
+        'atualizacoes': artefato['atualizacoes'],
+        'r2': artefato['r2'],
+        'mse': artefato['mse'],
+        'mae': artefato['mae'],
+        'treinado_em': treinado_em.isoformat(timespec='seconds'),
+    }
+
+
+# Função executada em cada processo: treina os modelos de um município e doença.
+# Os modelos que já existiam voltam só com a identificação e a chave
+# (`existente`), para que o processo principal complete o índice se preciso.
+def treinar_municipio(geocode, disease, model_options, atualizar=False, conferir=False):
+    if atualizar:
+        sincronizar(geocode, disease)
+
+    historical_weekly_cases, years_used = prepare_data(ler_serie(geocode, disease))
+    if historical_weekly_cases.empty:
+        return []
+
+    years = sorted(years_used)
+    linhas = []
+    for model_option in model_options:
+        chave = model_key(geocode, disease, historical_weekly_cases, years, model_option)
+        if modelo_lote_existe(chave):
+            # Mesmos dados do último treinamento: o modelo gravado continua válido
+            linhas.append({'geocode': int(geocode), 'disease': disease, 'modelo': model_option,
+                           'anos': f'{years[0]}-{years[-1]}', 'chave': chave, 'existente': True})
+            continue
+
+        artefato = build_model(geocode, disease, historical_weekly_cases, years, model_option)
+        if (conferir and artefato['atualizacoes'] and artefato['estatisticas'] is not None
+                and not conferir_atualizacao(artefato, historical_weekly_cases, years)):
+            raise ValueError(f"{model_option}: a atualização incremental difere do treinamento completo")
+        salvar_modelo(chave, artefato, lote=True, serie=series_key(geocode, disease, years, model_option))
+        linhas.append(_linha_indice(geocode, disease, model_option, f'{years[0]}-{years[-1]}', chave,
+                                    artefato, datetime.now()))
+    return linhas
+
+
+# Chaves dos modelos que já estão no índice
+def chaves_indexadas(caminho=ARQUIVO_INDICE):
+    if not os.path.exists(caminho):
+        return set()
+    return set(pd.read_csv(caminho, usecols=['chave'])['chave'])
+
+
+# Função para completar a linha de um modelo que já existia, mas ficou fora do
+# índice (execução interrompida antes de gravá-lo): as métricas vêm do artefato.
+# None se a linha já está no índice.
+def _linha_existente(linha, indexadas):
+    if linha['chave'] in indexadas:
+        return None
+    artefato = obter_modelo(linha['chave'])
+    if artefato is None:
+        return None
+    return _linha_indice(linha['geocode'], linha['disease'], linha['modelo'], linha['anos'], linha['chave'],
+                         artefato, datetime.fromtimestamp(data_modelo_lote(linha['chave'])))
+
+
+# Função para juntar as novas métricas ao índice e remover os artefatos substituídos
+def atualizar_indice(linhas, caminho=ARQUIVO_INDICE):
+    if not linhas:
+        return
+    novas = pd.DataFrame(linhas)
+    if os.path.exists(caminho):
+        indice = pd.read_csv(caminho)
+        substituidas = indice.merge(novas[COLUNAS_CHAVE + ['chave']], on=COLUNAS_CHAVE, suffixes=('', '_nova'))
+        for chave in substituidas.loc[substituidas['chave'] != substituidas['chave_nova'], 'chave']:
+            remover_modelo_lote(chave)
+        mantidas = indice.merge(novas[COLUNAS_CHAVE], on=COLUNAS_CHAVE, how='left', indicator=True)
+        indice = pd.concat([indice[(mantidas['_merge'] == 'left_only').to_numpy()], novas], ignore_index=True)
+    else:
+        indice = novas
+
+    temporario = f'{caminho}.tmp'
+    indice.sort_values(COLUNAS_CHAVE).to_csv(temporario, index=False)
+    os.replace(temporario, caminho)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Treina em lote os modelos de previsão de todos os municípios.")
+    parser.add_argument('--doencas', nargs='+', choices=DOENCAS, default=list(DOENCAS))
+    parser.add_argument('--modelos', nargs='+', choices=MODEL_OPTIONS, default=MODEL_OPTIONS)
+    parser.add_argument('--municipios', nargs='+', type=int, metavar='GEOCODE',
+                        help="Geocódigos a treinar (padrão: todos do allmun.json)")
+    parser.add_argument('--uf', help="Treina apenas os municípios desta UF (ex: SP)")
+    parser.add_argument('--processos', type=int, default=os.cpu_count())
+    parser.add_argument('--atualizar', action='store_true',
+                        help="Sincroniza as séries com a API antes de treinar (padrão: usa só os dados locais)")
+    parser.add_argument('--conferir', action='store_true',
+                        help="Confere cada regressão linear atualizada contra um treinamento completo")
+    args = parser.parse_args(argv)
+
+    geocodes = args.municipios
+    if not geocodes:
+        geocodes = carregar_catalogo().geocodes_da_uf(args.uf)
+
+    os.makedirs(DIRETORIO_LOTE, exist_ok=True)
+    tarefas = [(geocode, disease) for geocode in geocodes for disease in args.doencas]
+    total = len(tarefas)
+    pendentes = []
+    indexadas = chaves_indexadas()
+    falhas = 0
+    inicio = time.monotonic()
+
+    # spawn: cada processo abre as próprias conexões SQLite
+    contexto = multiprocessing.get_context('spawn')
+    with single_core_workers(), ProcessPoolExecutor(max_workers=args.processos, mp_context=contexto) as executor:
+        futures = {
+            executor.submit(treinar_municipio, geocode, disease, args.modelos, args.atualizar, args.conferir): (geocode, disease)
+            for geocode, disease in tarefas
+        }
+        for feitos, future in enumerate(as_completed(futures), start=1):
+            geocode, disease = futures[future]
+            try:
+                linhas = future.result()
+            except (ErroAPI, ValueError) as e:
+                falhas += 1
+                status = f"erro: {e}"
+            else:
+                novas = [linha for linha in linhas if not linha.get('existente')]
+                recuperadas = [_linha_existente(linha, indexadas) for linha in linhas if linha.get('existente')]
+                recuperadas = [linha for linha in recuperadas if linha is not None]
+                pendentes.extend(novas + recuperadas)
+                indexadas.update(linha['chave'] for linha in novas + recuperadas)
+                status = f"{len(novas)} modelos treinados ou atualizados"
+                if recuperadas:
+                    status += f", {len(recuperadas)} recolocados no índice"
+
+            # O índice é gravado aos poucos para não perder o trabalho se a execução parar
+            if len(pendentes) >= 200:
+                atualizar_indice(pendentes)
+                pendentes = []
+
+            decorrido = time.monotonic() - inicio
+            print(f"[{feitos}/{total}] {geocode} {disease}: {status} ({decorrido:.0f}s)", file=sys.stderr)
+
+    atualizar_indice(pendentes)
+    print(f"Concluído: {total - falhas} municípios/doenças processados, {falhas} falhas. Índice em {ARQUIVO_INDICE}",
+          file=sys.stderr)
+    return 1 if falhas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())